@@ -1,5 +1,6 @@
-from .viewsets import DirectoryEntriesViewSet
+from .viewsets import DirectoryEntriesViewSet, ScanHistoryViewSet
 from .csp import CSPCompatibleRouter
 
 api_router = CSPCompatibleRouter('directoryapi')
 api_router.register('directory', DirectoryEntriesViewSet)
+api_router.register('scans', ScanHistoryViewSet, basename='scanhistory')
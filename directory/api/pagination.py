@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DirectoryEntryPagination(CursorPagination):
+    """
+    Keyset pagination of directory entries, by primary key so that pages
+    stay consistent while entries are published.  Only used when a
+    client asks for it with `page_size`; otherwise every entry is listed
+    at once, as clients of the API have always expected.
+    """
+    ordering = 'pk'
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 500
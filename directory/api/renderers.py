@@ -0,0 +1,54 @@
+import csv
+import json
+from io import StringIO
+from typing import Iterable, Iterator, List
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Renders rows of data either all at once, like other renderers, or a
+    row at a time with `stream`, for the body of a StreamingHttpResponse
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Anything but a list of rows, such as an error, is one row
+        rows = data if isinstance(data, list) else [data]
+        columns = list(rows[0]) if rows else []
+        return b''.join(self.stream(columns, rows))
+
+    def stream(self, columns: List[str], rows: Iterable[dict]) -> Iterator[bytes]:
+        raise NotImplementedError
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """Renders each row as a JSON object on a line of its own"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def stream(self, columns, rows):
+        for row in rows:
+            line = json.dumps(row, cls=JSONEncoder, ensure_ascii=False) + '\n'
+            yield line.encode(self.charset)
+
+
+class CSVRenderer(StreamingRenderer):
+    """Renders rows as CSV, with a header row naming the columns"""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, columns, rows):
+        buffer = StringIO()
+        writer = csv.DictWriter(buffer, columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
+        # Only the header was written if there were no rows
+        if buffer.tell():
+            yield buffer.getvalue().encode(self.charset)
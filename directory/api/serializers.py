@@ -1,11 +1,35 @@
+from django.core.cache import cache
 from rest_framework import serializers
 from wagtail.images.api.fields import ImageRenditionField
 
-from directory.models.entry import DirectoryEntry, ScanResult
+from directory.models.entry import SCAN_CHECKS, DirectoryEntry, ScanResult
+
+
+# Rendition of the organization logo that is linked to
+LOGO_RENDITION = 'max-1500x1500'
+
+# Grades that ScanResult.compute_grade gives
+SCAN_GRADES = ('A', 'B', 'C', 'D', 'F', '?')
+
+# Seconds that the serialization of an entry is cached for
+ENTRY_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def entry_cache_key(entry: DirectoryEntry) -> str:
+    """Key of the cached serialization of `entry`.  It changes whenever
+    the entry is published or scanned, so that cached copies never need
+    to be deleted."""
+    result = entry.latest_live_result
+    return 'directory-entry-api:{}:{}:{}:{}'.format(
+        entry.pk,
+        entry.last_published_at and entry.last_published_at.isoformat(),
+        entry.latest_live_result_id,
+        result and result.result_last_seen.isoformat(),
+    )
 
 
 class DirectoryEntrySerializer(serializers.ModelSerializer):
-    organization_logo = ImageRenditionField('max-1500x1500')
+    organization_logo = ImageRenditionField(LOGO_RENDITION)
     directory_url = serializers.CharField(source='full_url')
     onion_address = serializers.CharField(source='full_onion_address')
     languages = serializers.SlugRelatedField(
@@ -44,6 +68,32 @@ class DirectoryEntrySerializer(serializers.ModelSerializer):
             'latest_scan',
         ]
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """`fields` optionally names the only fields to include"""
+        super().__init__(*args, **kwargs)
+        self.selected_fields = fields
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError({
+                    'fields': 'Unknown fields: {}'.format(', '.join(sorted(unknown))),
+                })
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        # Only serializations of every field are cached, but a selection
+        # of fields is taken from one if it is there
+        key = entry_cache_key(instance)
+        data = cache.get(key)
+        if data is None:
+            data = super().to_representation(instance)
+            if self.selected_fields is None:
+                cache.set(key, data, ENTRY_CACHE_TIMEOUT)
+        elif self.selected_fields is not None:
+            data = {name: data[name] for name in self.fields}
+        return data
+
     def get_latest_scan(self, directory_entry):
         latest = directory_entry.get_live_result()
 
@@ -58,6 +108,34 @@ class ScanResultSerializer(serializers.ModelSerializer):
         exclude = (
             'securedrop',
             'id',
-            'cross_domain_asset_summary',
-            'ignored_cross_domain_assets',
+            'checks',
+            'checks_known',
+            'asset_summary',
+            'ignored_asset_summary',
+            'etag',
+            'last_modified',
+            'analytics_trackers',
+            'fingerprint',
         )
+
+    def get_field_names(self, declared_fields, info):
+        # The results of the checks are not model fields, see
+        # ScanResult.checks
+        checks = [
+            name for name in SCAN_CHECKS
+            if name not in ('body_truncated', 'script_scan_incomplete')
+        ]
+        return list(super().get_field_names(declared_fields, info)) + checks
+
+
+class ScanHistoryFilterSerializer(serializers.Serializer):
+    """Query parameters of the scan history endpoint"""
+    since = serializers.DateField(required=False, help_text='Earliest day of scans')
+    until = serializers.DateField(required=False, help_text='Latest day of scans')
+    grade = serializers.MultipleChoiceField(choices=SCAN_GRADES, required=False)
+    entry = serializers.SlugField(required=False, help_text='Slug of a directory entry')
+
+    def validate(self, data):
+        if 'since' in data and 'until' in data and data['since'] > data['until']:
+            raise serializers.ValidationError('since must not be after until')
+        return data
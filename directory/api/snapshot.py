@@ -0,0 +1,146 @@
+"""Static snapshots of the directory API.
+
+A snapshot is the JSON the API serves for the list of entries and for
+each entry, written to DIRECTORY_SNAPSHOT_ROOT so that a web server or
+CDN can serve it without touching the database:
+
+    current.json                    which version is current
+    <version>/directory.json        the list of entries
+    <version>/directory/<pk>.json   each entry
+
+Every file is written alongside a gzipped copy, `<name>.json.gz`.  The
+version is a digest of the list, and each version's directory is
+written in full before current.json is replaced to point at it, so
+readers only ever see a complete snapshot.
+
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from directory.models.entry import DirectoryEntry
+
+from .serializers import DirectoryEntrySerializer
+
+
+MANIFEST_NAME = 'current.json'
+
+LIST_NAME = 'directory'
+
+# Versions kept besides the current one, for readers that read the
+# manifest just before it was replaced
+KEEP_PREVIOUS_VERSIONS = 1
+
+
+def snapshot_root() -> Optional[str]:
+    return settings.DIRECTORY_SNAPSHOT_ROOT
+
+
+def entry_name(pk) -> str:
+    return '{}/{}'.format(LIST_NAME, pk)
+
+
+def write_json(directory: str, name: str, content: bytes) -> None:
+    path = os.path.join(directory, name + '.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    with open(path + '.gz', 'wb') as f:
+        # No timestamp, so that identical content compresses identically
+        f.write(gzip.compress(content, mtime=0))
+
+
+def read_manifest(root: Optional[str] = None) -> Optional[dict]:
+    """Return the manifest of the current snapshot in `root`, or None if
+    there is none"""
+    root = root or snapshot_root()
+    if not root:
+        return None
+    try:
+        with open(os.path.join(root, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    manifest['created'] = datetime.fromisoformat(manifest['created'])
+    return manifest
+
+
+def snapshot_path(manifest: dict, name: str, root: Optional[str] = None) -> Optional[str]:
+    """Return the path of the gzipped file `name` of the snapshot that
+    `manifest` describes, or None if the snapshot has no such file"""
+    path = os.path.join(root or snapshot_root(), manifest['version'], name + '.json.gz')
+    return path if os.path.exists(path) else None
+
+
+def write_snapshot(entries: Iterable[DirectoryEntry], root: Optional[str] = None) -> dict:
+    """Write a snapshot of the API's serialization of `entries` to `root`
+    and make it current, unless the current snapshot is identical.
+    Return its manifest.
+
+    """
+    root = root or snapshot_root()
+    os.makedirs(root, exist_ok=True)
+    renderer = JSONRenderer()
+    entries = list(entries)
+    data = DirectoryEntrySerializer(entries, many=True).data
+    content = renderer.render(data)
+    version = hashlib.sha256(content).hexdigest()[:16]
+
+    manifest = read_manifest(root)
+    if manifest and manifest['version'] == version:
+        return manifest
+
+    version_directory = os.path.join(root, version)
+    if not os.path.isdir(version_directory):
+        staging = tempfile.mkdtemp(dir=root, prefix='.')
+        write_json(staging, LIST_NAME, content)
+        for entry, entry_data in zip(entries, data):
+            write_json(staging, entry_name(entry.pk), renderer.render(entry_data))
+        os.chmod(staging, 0o755)
+        try:
+            os.replace(staging, version_directory)
+        except OSError:
+            # Another process wrote the same version meanwhile
+            shutil.rmtree(staging, ignore_errors=True)
+
+    manifest = {'version': version, 'created': timezone.now(), 'count': len(data)}
+    with tempfile.NamedTemporaryFile('w', dir=root, prefix='.', delete=False) as f:
+        json.dump(dict(manifest, created=manifest['created'].isoformat()), f)
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, os.path.join(root, MANIFEST_NAME))
+
+    prune_versions(root, version)
+    return manifest
+
+
+def prune_versions(root: str, current: str) -> None:
+    """Delete all but the newest versions in `root` besides `current`"""
+    versions = sorted(
+        (
+            entry for entry in os.scandir(root)
+            if entry.is_dir() and not entry.name.startswith('.') and entry.name != current
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in versions[KEEP_PREVIOUS_VERSIONS:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def refresh_snapshot() -> Optional[dict]:
+    """Write a snapshot of every entry the API lists, if snapshots are
+    enabled"""
+    if not snapshot_root():
+        return None
+    # Imported here because the viewset serves the snapshots
+    from .viewsets import DirectoryEntriesViewSet
+    return write_snapshot(DirectoryEntriesViewSet.queryset.all())
@@ -1,11 +1,247 @@
-from rest_framework.viewsets import ReadOnlyModelViewSet
+import gzip
+import hashlib
+from datetime import date, datetime, time, timedelta
 
-from directory.models.entry import DirectoryEntry
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F, Max, Prefetch
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.fields import BooleanField
+from rest_framework.viewsets import ReadOnlyModelViewSet, ViewSet
 
-from .serializers import DirectoryEntrySerializer
+from common.models import CustomImage
+from directory.models.entry import DirectoryEntry, ScanResult
+
+from .pagination import DirectoryEntryPagination
+from .renderers import CSVRenderer, NDJSONRenderer
+from .serializers import (
+    LOGO_RENDITION,
+    DirectoryEntrySerializer,
+    ScanHistoryFilterSerializer,
+    ScanResultSerializer,
+)
+from .snapshot import LIST_NAME, entry_name, read_manifest, snapshot_path
 from .csp import CSPCompatibleViewSetMixin
 
 
+# Lookups to prefetch for the fields of DirectoryEntrySerializer that
+# need them
+FIELD_PREFETCHES = {
+    'languages': 'languages',
+    'topics': 'topics',
+    'countries': 'countries',
+    'organization_logo': Prefetch(
+        'organization_logo',
+        queryset=CustomImage.objects.prefetch_renditions(LOGO_RENDITION),
+    ),
+}
+
+
 class DirectoryEntriesViewSet(CSPCompatibleViewSetMixin, ReadOnlyModelViewSet):
+    """
+    Listed directory entries.  Clients may ask for only some `fields`,
+    as a comma-separated list, or leave out the latest scan with
+    `include_scan=false`, and may page through entries by giving a
+    `page_size`.
+    """
     serializer_class = DirectoryEntrySerializer
-    queryset = DirectoryEntry.objects.listed().live()
+    pagination_class = DirectoryEntryPagination
+    # Everything the serializer needs is fetched in a fixed number of
+    # queries, however many entries there are
+    queryset = DirectoryEntry.objects.listed().live().select_related(
+        'latest_live_result',
+    ).prefetch_related(*FIELD_PREFETCHES.values())
+
+    def get_selected_fields(self):
+        """Return the names of the fields the client asked for, or None
+        for all of them"""
+        params = self.request.query_params
+        fields = list(DirectoryEntrySerializer.Meta.fields)
+        if params.get('fields'):
+            fields = [name.strip() for name in params['fields'].split(',') if name.strip()]
+        if 'include_scan' in params:
+            include_scan = BooleanField().run_validation(params['include_scan'])
+            if not include_scan and 'latest_scan' in fields:
+                fields.remove('latest_scan')
+        if fields == DirectoryEntrySerializer.Meta.fields:
+            return None
+        return fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_selected_fields()
+        if fields is not None:
+            # Only prefetch what the selected fields need
+            queryset = queryset.prefetch_related(None).prefetch_related(*(
+                FIELD_PREFETCHES[name] for name in fields if name in FIELD_PREFETCHES
+            ))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_selected_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_validators(self, queryset):
+        """Return the number of entries in `queryset` and an ETag and
+        Last-Modified timestamp for them, from a single aggregate query.
+        The ETag changes when an entry is published, unpublished or
+        scanned.
+
+        """
+        state = queryset.order_by().aggregate(
+            count=Count('pk'),
+            published=Max('last_published_at'),
+            scanned=Max('latest_live_result__result_last_seen'),
+        )
+        last_modified = max(
+            (timestamp for timestamp in (state['published'], state['scanned']) if timestamp),
+            default=None,
+        )
+        # The same entries render differently as JSON and in the browsable
+        # API, and with different fields or pages
+        key = '{}:{}:{}:{}:{}'.format(
+            state['count'],
+            state['published'] and state['published'].isoformat(),
+            state['scanned'] and state['scanned'].isoformat(),
+            self.request.accepted_media_type,
+            self.request.get_full_path(),
+        )
+        etag = quote_etag(hashlib.sha256(key.encode('utf-8')).hexdigest())
+        return state['count'], etag, last_modified and int(last_modified.timestamp())
+
+    def conditional(self, queryset, handler, *args, allow_empty=True,
+                    with_last_modified=True, **kwargs):
+        """Respond with 304 Not Modified if the client's copy of the
+        entries in `queryset` is current, without serializing them, or
+        else with `handler`'s response.  Unless `with_last_modified` is
+        set, the response is validated by its ETag alone."""
+        count, etag, last_modified = self.get_validators(queryset)
+        if not with_last_modified:
+            last_modified = None
+        response = None
+        if count or allow_empty:
+            response = get_conditional_response(
+                self.request, etag=etag, last_modified=last_modified,
+            )
+        if response is None:
+            response = handler(self.request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def snapshot_response(self, name):
+        """Respond with the file `name` of the current static snapshot,
+        without touching the database, or return None if there is no
+        snapshot of it"""
+        # Snapshots are of all fields of all entries, as JSON
+        if self.request.accepted_renderer.format != 'json':
+            return None
+        if set(self.request.query_params) - {'format'}:
+            return None
+        manifest = read_manifest()
+        path = manifest and snapshot_path(manifest, name)
+        if not path:
+            return None
+
+        etag = quote_etag(manifest['version'])
+        last_modified = int(manifest['created'].timestamp())
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified,
+        )
+        if response is None:
+            with open(path, 'rb') as f:
+                content = f.read()
+            response = HttpResponse(content_type='application/json')
+            if 'gzip' in self.request.headers.get('Accept-Encoding', ''):
+                response['Content-Encoding'] = 'gzip'
+            else:
+                content = gzip.decompress(content)
+            response.content = content
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # The latest time an entry was published or scanned can stay the
+        # same or go back when an entry is unpublished or deleted, so it
+        # cannot tell clients whether the list has changed
+        return self.snapshot_response(LIST_NAME) or self.conditional(
+            self.filter_queryset(self.get_queryset()),
+            super().list, *args, with_last_modified=False, **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = self.kwargs[lookup_url_kwarg]
+        if lookup.isdigit():
+            response = self.snapshot_response(entry_name(lookup))
+            if response is not None:
+                return response
+        try:
+            queryset = self.get_queryset().filter(
+                **{self.lookup_field: lookup}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # As get_object_or_404 does for lookups that cannot be a key
+            raise Http404
+        return self.conditional(
+            queryset, super().retrieve, *args, allow_empty=False, **kwargs,
+        )
+
+
+def start_of_day(day: date) -> datetime:
+    """Midnight at the start of `day` in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class ScanHistoryViewSet(CSPCompatibleViewSetMixin, ViewSet):
+    """
+    Every scan result of listed directory entries, oldest first, streamed
+    as newline-delimited JSON or, with `format=csv`, as CSV.  Results can
+    be filtered to those seen `since` and `until` given days, with given
+    `grade`s, or of the `entry` with a given slug.
+    """
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    # Rows fetched from the database at a time, which bounds the memory
+    # used however much history is streamed
+    chunk_size = 2000
+
+    def get_queryset(self, since=None, until=None, grade=None, entry=None):
+        results = ScanResult.objects.filter(
+            securedrop__in=DirectoryEntry.objects.listed().live(),
+        ).annotate(entry=F('securedrop__slug')).order_by('result_last_seen', 'pk')
+        # Compare against the bounds of the days, rather than the dates of
+        # the results, so that the index on result_last_seen can be used
+        if since:
+            results = results.filter(result_last_seen__gte=start_of_day(since))
+        if until:
+            results = results.filter(
+                result_last_seen__lt=start_of_day(until + timedelta(days=1)),
+            )
+        if grade:
+            results = results.filter(grade__in=grade)
+        if entry:
+            results = results.filter(securedrop__slug=entry)
+        return results
+
+    def list(self, request):
+        filters = ScanHistoryFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        results = self.get_queryset(**filters.validated_data)
+
+        serializer = ScanResultSerializer()
+        columns = ['entry'] + list(serializer.fields)
+        rows = (
+            dict(entry=result.entry, **serializer.to_representation(result))
+            for result in results.iterator(chunk_size=self.chunk_size)
+        )
+        renderer = request.accepted_renderer
+        return StreamingHttpResponse(
+            renderer.stream(columns, rows),
+            content_type='{}; charset={}'.format(renderer.media_type, renderer.charset),
+        )
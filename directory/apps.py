@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class DirectoryConfig(AppConfig):
+    name = 'directory'
+
+    def ready(self):
+        import directory.signals  # noqa: F401
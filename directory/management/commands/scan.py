@@ -1,8 +1,11 @@
 from django.core.management import BaseCommand, CommandError
 
+from directory.api.snapshot import refresh_snapshot
 from directory.models import DirectoryEntry
-from scanner.scanner import bulk_scan
-from scanner.utils import url_to_domain
+from scanner.scanner import MAX_PAGE_BODY_SIZE, bulk_scan
+from scanner.scheduling import scheduled_scan
+from scanner.session import ScanSession
+from scanner.utils import domain_cache, url_to_domain
 
 
 class Command(BaseCommand):
@@ -22,8 +25,78 @@ class Command(BaseCommand):
                 "directory."
             ),
         )
+        parser.add_argument(
+            '-w',
+            '--workers',
+            dest='workers',
+            type=int,
+            default=1,
+            help=(
+                "Number of landing pages to scan concurrently. Defaults to 1, "
+                "which scans one landing page at a time."
+            ),
+        )
+        parser.add_argument(
+            '--asyncio',
+            action='store_true',
+            dest='asyncio',
+            default=False,
+            help=(
+                "Drive the scans from an asyncio event loop. Scans run the "
+                "same way as without it; --workers sets how many are in "
+                "flight."
+            ),
+        )
+        parser.add_argument(
+            '--revalidate',
+            action='store_true',
+            dest='revalidate',
+            default=False,
+            help=(
+                "Request landing pages conditionally, using the ETag and "
+                "Last-Modified of their latest scan, and reuse the content "
+                "checks of that scan for pages that have not changed."
+            ),
+        )
+        parser.add_argument(
+            '--max-body-size',
+            dest='max_body_size',
+            type=int,
+            default=MAX_PAGE_BODY_SIZE,
+            help=(
+                "Largest number of bytes of a landing page to read and "
+                "check. Larger pages are cut off and marked as truncated. "
+                "Defaults to %(default)s."
+            ),
+        )
+        parser.add_argument(
+            '--scheduled',
+            action='store_true',
+            dest='scheduled',
+            default=False,
+            help=(
+                "Only scan listed, published landing pages that are due for "
+                "a scan, most overdue first. Failing and recently edited "
+                "landing pages are due sooner than ones that pass every check."
+            ),
+        )
+        parser.add_argument(
+            '--time-budget',
+            dest='time_budget',
+            type=float,
+            default=None,
+            help=(
+                "With --scheduled, stop starting new scans after this many "
+                "seconds. Landing pages left over are scanned by the next run."
+            ),
+        )
 
     def handle(self, *args, **options):
+        if options['scheduled'] and options['securedrops']:
+            raise CommandError('--scheduled cannot be combined with a list of landing pages')
+        if options['time_budget'] is not None and not options['scheduled']:
+            raise CommandError('--time-budget requires --scheduled')
+
         if options['securedrops']:
             requested_domains = [url_to_domain(x) for x in options['securedrops']]
             securedrop_pages = DirectoryEntry.objects.with_domain_annotation()\
@@ -43,5 +116,41 @@ class Command(BaseCommand):
         else:
             securedrop_pages = DirectoryEntry.objects.all()
 
-        bulk_scan(securedrop_pages)
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        if options['max_body_size'] < 1:
+            raise CommandError('--max-body-size must be at least 1')
+
+        # Load the suffix list before the workers all need it at once
+        domain_cache.warm()
+        with ScanSession() as session:
+            scan_options = {
+                'workers': options['workers'],
+                'use_asyncio': options['asyncio'],
+                'session': session,
+                'revalidate': options['revalidate'],
+                'max_body_size': options['max_body_size'],
+            }
+            if options['scheduled']:
+                scanned = scheduled_scan(time_budget=options['time_budget'], **scan_options)
+                self.stdout.write('Scanned {} landing pages that were due.'.format(len(scanned)))
+            else:
+                bulk_scan(securedrop_pages, **scan_options)
+            stats = session.stats()
+            asset_cache_stats = session.asset_cache.stats()
         self.stdout.write('Scanning complete! Results added to database.')
+        manifest = refresh_snapshot()
+        if manifest:
+            self.stdout.write('API snapshot {version} is current.'.format(**manifest))
+        self.stdout.write(
+            'Made {requests} requests over {connections} connections '
+            '({reused_connections} reused).'.format(**stats)
+        )
+        self.stdout.write(
+            'Asset cache: {hits} hits, {misses} misses, '
+            '{size} assets cached.'.format(**asset_cache_stats)
+        )
+        self.stdout.write(
+            'Domain cache: {hits} hits, {misses} misses, '
+            '{size} host names cached.'.format(**domain_cache.stats())
+        )
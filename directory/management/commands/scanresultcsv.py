@@ -1,9 +1,9 @@
-import argparse
+import gzip
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from directory.models.entry import DirectoryEntry
-from directory.utils import scan_csv
+from directory.utils import write_scan_csv
 
 
 class Command(BaseCommand):
@@ -14,14 +14,32 @@ class Command(BaseCommand):
             '-o',
             '--output',
             dest='output',
-            type=argparse.FileType('w')
+            help='File to write the CSV to, instead of standard output',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            dest='gzip',
+            default=False,
+            help=(
+                'Compress the CSV with gzip. Implied by an --output file '
+                'name ending in .gz.'
+            ),
         )
 
     def handle(self, *args, **options):
-        if options['output'] is not None:
-            stream = options['output']
-        else:
-            stream = self.stdout
+        output = options['output']
+        compress = options['gzip'] or (output or '').endswith('.gz')
         entries = DirectoryEntry.objects.all()
-        output = scan_csv(entries)
-        stream.write(output)
+
+        if output is None:
+            if compress:
+                raise CommandError('--gzip requires --output')
+            write_scan_csv(entries, self.stdout)
+            return
+
+        # Rows are written as they are read, so the whole CSV is never
+        # held in memory
+        opener = gzip.open if compress else open
+        with opener(output, 'wt', newline='', encoding='utf-8') as stream:
+            write_scan_csv(entries, stream)
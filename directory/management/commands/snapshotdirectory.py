@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from directory.api.snapshot import read_manifest, snapshot_root, write_snapshot
+from directory.api.viewsets import DirectoryEntriesViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Write a static snapshot of the directory API, which is served '
+        'in place of querying the database until the next snapshot'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--root',
+            default=snapshot_root(),
+            help=(
+                'Directory to write the snapshot to. Defaults to the '
+                'DIRECTORY_SNAPSHOT_ROOT setting.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        root = options['root']
+        if not root:
+            raise CommandError('Give --root or set DIRECTORY_SNAPSHOT_ROOT')
+
+        previous = read_manifest(root)
+        manifest = write_snapshot(DirectoryEntriesViewSet.queryset.all(), root)
+        if previous and previous['version'] == manifest['version']:
+            self.stdout.write('Snapshot {version} of {count} entries is unchanged.'.format(**manifest))
+        else:
+            self.stdout.write('Wrote snapshot {version} of {count} entries to {root}.'.format(
+                root=root, **manifest,
+            ))
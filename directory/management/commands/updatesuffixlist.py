@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from tldextract.suffix_list import extract_tlds_from_suffix_list
+
+from scanner.utils import HEADERS, PUBLIC_SUFFIX_LIST_PATH, PUBLIC_SUFFIX_LIST_URL
+
+
+class Command(BaseCommand):
+    help = (
+        'Replace the copy of the Public Suffix List used by the scanner '
+        'with the latest one'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default=PUBLIC_SUFFIX_LIST_URL,
+            help='Where to fetch the list from (default: %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        url = options['url']
+        try:
+            response = requests.get(url, headers=HEADERS, timeout=30)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise CommandError('Could not fetch {}: {}'.format(url, e))
+
+        try:
+            text = response.content.decode('utf-8')
+        except UnicodeDecodeError:
+            raise CommandError('{} is not a UTF-8 text file'.format(url))
+        public_suffixes, private_suffixes = extract_tlds_from_suffix_list(text)
+        if 'com' not in public_suffixes:
+            raise CommandError('{} does not look like a public suffix list'.format(url))
+
+        # Write the new list next to the old one and swap it in, so that
+        # scanners starting meanwhile never read half a list
+        directory = os.path.dirname(PUBLIC_SUFFIX_LIST_PATH)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.dat', delete=False) as f:
+            f.write(response.content)
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, PUBLIC_SUFFIX_LIST_PATH)
+
+        self.stdout.write(
+            'Updated {} with {} public and {} private suffixes.'.format(
+                PUBLIC_SUFFIX_LIST_PATH, len(public_suffixes), len(private_suffixes),
+            )
+        )
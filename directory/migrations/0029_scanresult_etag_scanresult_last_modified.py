@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0028_remove_directorysettings_allow_directory_management'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='etag',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='last_modified',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0029_scanresult_etag_scanresult_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='body_truncated',
+            field=models.BooleanField(default=False),
+        ),
+    ]
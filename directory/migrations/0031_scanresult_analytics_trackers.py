@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0030_scanresult_body_truncated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='analytics_trackers',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,296 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:54
+
+import hashlib
+import uuid
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# SCAN_CHECKS as of this migration
+SCAN_CHECKS = (
+    'forces_https',
+    'hsts',
+    'hsts_max_age',
+    'hsts_entire_domain',
+    'hsts_preloaded',
+    'http_status_200_ok',
+    'no_cross_domain_redirects',
+    'expected_encoding',
+    'http2',
+    'no_server_info',
+    'no_server_version',
+    'csp_origin_only',
+    'mime_sniffing_blocked',
+    'noopen_download',
+    'xss_protection',
+    'clickjacking_protection',
+    'good_cross_domain_policy',
+    'http_1_0_caching_disabled',
+    'cache_control_set',
+    'cache_control_revalidate_set',
+    'cache_control_nocache_set',
+    'cache_control_notransform_set',
+    'cache_control_nostore_set',
+    'cache_control_private_set',
+    'expires_set',
+    'referrer_policy_set_to_no_referrer',
+    'safe_onion_address',
+    'no_cdn',
+    'no_analytics',
+    'subdomain',
+    'no_cookies',
+    'no_cross_domain_assets',
+    'body_truncated',
+)
+
+# Pairs of the text field of a scan result and the summary it moves to
+ASSET_SUMMARY_FIELDS = (
+    ('cross_domain_asset_summary', 'asset_summary'),
+    ('ignored_cross_domain_assets', 'ignored_asset_summary'),
+)
+
+BATCH_SIZE = 1000
+
+
+def digest_of(text):
+    return uuid.UUID(bytes=hashlib.sha256(text.encode('utf-8')).digest()[:16])
+
+
+def pack_results(apps, schema_editor):
+    """Pack the check columns of every scan result into its bitmasks, and
+    move its asset summaries into the summary table"""
+    ScanResult = apps.get_model('directory', 'ScanResult')
+    AssetSummary = apps.get_model('directory', 'AssetSummary')
+
+    results = []
+    summaries = {}
+
+    def flush():
+        AssetSummary.objects.bulk_create(summaries.values(), ignore_conflicts=True)
+        ScanResult.objects.bulk_update(
+            results,
+            ['checks', 'checks_known', 'asset_summary', 'ignored_asset_summary'],
+        )
+        results.clear()
+        summaries.clear()
+
+    for result in ScanResult.objects.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        result.checks = result.checks_known = 0
+        for bit, name in enumerate(SCAN_CHECKS):
+            value = getattr(result, name)
+            if value is not None:
+                result.checks_known |= 1 << bit
+            if value:
+                result.checks |= 1 << bit
+        for text_field, summary_field in ASSET_SUMMARY_FIELDS:
+            text = getattr(result, text_field)
+            if text:
+                digest = digest_of(text)
+                summaries[digest] = AssetSummary(digest=digest, text=text)
+                setattr(result, summary_field + '_id', digest)
+        results.append(result)
+        if len(results) >= BATCH_SIZE:
+            flush()
+    flush()
+
+
+def unpack_results(apps, schema_editor):
+    """Reverse of pack_results"""
+    ScanResult = apps.get_model('directory', 'ScanResult')
+
+    results = []
+    fields = SCAN_CHECKS + tuple(text_field for text_field, _ in ASSET_SUMMARY_FIELDS)
+    queryset = ScanResult.objects.select_related('asset_summary', 'ignored_asset_summary')
+    for result in queryset.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        for bit, name in enumerate(SCAN_CHECKS):
+            if result.checks_known & (1 << bit):
+                setattr(result, name, bool(result.checks & (1 << bit)))
+            else:
+                setattr(result, name, None)
+        for text_field, summary_field in ASSET_SUMMARY_FIELDS:
+            summary = getattr(result, summary_field)
+            setattr(result, text_field, summary.text if summary else '')
+        results.append(result)
+        if len(results) >= BATCH_SIZE:
+            ScanResult.objects.bulk_update(results, fields)
+            results.clear()
+    ScanResult.objects.bulk_update(results, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0031_scanresult_analytics_trackers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetSummary',
+            fields=[
+                ('digest', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('text', models.TextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='checks',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='checks_known',
+            field=models.BigIntegerField(default=4294967552),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='asset_summary',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='directory.assetsummary'),
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='ignored_asset_summary',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='directory.assetsummary'),
+        ),
+        migrations.RunPython(pack_results, unpack_results),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='body_truncated',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='cache_control_nocache_set',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='cache_control_nostore_set',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='cache_control_notransform_set',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='cache_control_private_set',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='cache_control_revalidate_set',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='cache_control_set',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='clickjacking_protection',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='cross_domain_asset_summary',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='csp_origin_only',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='expected_encoding',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='expires_set',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='forces_https',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='good_cross_domain_policy',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='hsts',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='hsts_entire_domain',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='hsts_max_age',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='hsts_preloaded',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='http2',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='http_1_0_caching_disabled',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='http_status_200_ok',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='ignored_cross_domain_assets',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='mime_sniffing_blocked',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='no_analytics',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='no_cdn',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='no_cookies',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='no_cross_domain_assets',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='no_cross_domain_redirects',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='no_server_info',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='no_server_version',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='noopen_download',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='referrer_policy_set_to_no_referrer',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='safe_onion_address',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='subdomain',
+        ),
+        migrations.RemoveField(
+            model_name='scanresult',
+            name='xss_protection',
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.11 on 2026-10-18 17:00
+
+import hashlib
+import json
+import uuid
+
+from django.db import migrations, models
+
+
+# Attributes of FINGERPRINT_FIELDS as of this migration
+FINGERPRINT_ATTRIBUTES = (
+    'landing_page_url',
+    'redirect_target',
+    'live',
+    'checks',
+    'checks_known',
+    'asset_summary_id',
+    'ignored_asset_summary_id',
+    'analytics_trackers',
+)
+
+BATCH_SIZE = 1000
+
+
+def compute_fingerprints(apps, schema_editor):
+    """Fingerprint every existing scan result, as ScanResult.save would"""
+    ScanResult = apps.get_model('directory', 'ScanResult')
+
+    results = []
+    for result in ScanResult.objects.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        values = [getattr(result, attribute) for attribute in FINGERPRINT_ATTRIBUTES]
+        text = json.dumps(values, default=str)
+        result.fingerprint = uuid.UUID(bytes=hashlib.sha256(text.encode('utf-8')).digest()[:16])
+        results.append(result)
+        if len(results) >= BATCH_SIZE:
+            ScanResult.objects.bulk_update(results, ['fingerprint'])
+            results.clear()
+    ScanResult.objects.bulk_update(results, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0032_scanresult_packed_checks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='fingerprint',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(compute_fingerprints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='scanresult',
+            index=models.Index(fields=['fingerprint'], name='directory_s_fingerp_8258dd_idx'),
+        ),
+    ]
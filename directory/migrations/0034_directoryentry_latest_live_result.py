@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-18 17:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def point_at_latest_live_results(apps, schema_editor):
+    """Point every entry at its latest live scan result"""
+    DirectoryEntry = apps.get_model('directory', 'DirectoryEntry')
+    ScanResult = apps.get_model('directory', 'ScanResult')
+
+    latest_live_results = ScanResult.objects.filter(
+        live=True,
+        securedrop__isnull=False,
+    ).order_by('securedrop_id', '-result_last_seen').distinct('securedrop_id')
+    for result in latest_live_results:
+        DirectoryEntry.objects.filter(pk=result.securedrop_id).update(latest_live_result=result)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0033_scanresult_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='directoryentry',
+            name='latest_live_result',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='directory.scanresult'),
+        ),
+        migrations.AddIndex(
+            model_name='scanresult',
+            index=models.Index(fields=['securedrop', 'live', 'result_last_seen'], name='directory_s_secured_81e58a_idx'),
+        ),
+        migrations.RunPython(point_at_latest_live_results, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0034_directoryentry_latest_live_result'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scanresult',
+            name='checks_known',
+            field=models.BigIntegerField(default=12884902144),
+        ),
+    ]
@@ -1,11 +1,14 @@
+import hashlib
+import json
 import re
+import uuid
 
 from django import forms
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
-from django.db.models import Func, F, Q, Value
+from django.db import models, transaction
+from django.db.models import Func, F, OuterRef, Q, Subquery, Value
 from modelcluster.fields import ParentalKey, ParentalManyToManyField
 from django.contrib.postgres.fields import ArrayField
 
@@ -61,6 +64,21 @@ class DirectoryEntryQuerySet(PageQuerySet):
             )
         )
 
+    def with_latest_result_annotation(self):
+        """
+        Return the queryset with the `result_last_seen` time and `grade` of
+        each entry's latest scan result annotated on as
+        `latest_result_last_seen` and `latest_result_grade`. Both are None
+        for entries that have never been scanned.
+        """
+        latest_results = ScanResult.objects.filter(
+            securedrop=OuterRef('pk'),
+        ).order_by('-result_last_seen')
+        return self.annotate(
+            latest_result_last_seen=Subquery(latest_results.values('result_last_seen')[:1]),
+            latest_result_grade=Subquery(latest_results.values('grade')[:1]),
+        )
+
 
 class DirectoryEntryManager(PageManager):
     """
@@ -252,6 +270,18 @@ class DirectoryEntry(MetadataPageMixin, Page):
                    'viewing this entry, even if they are in the scan results.'),
     )
 
+    # The result of the most recent scan that found the landing page live,
+    # kept up to date by ScanResult.save and bulk_scan, and looked up again
+    # whenever the entry is saved
+    latest_live_result = models.ForeignKey(
+        'ScanResult',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+
     content_panels = Page.content_panels + [
         HelpPanel(heading='Date Added', template='directory/admin_directory_entry_added_field.html'),
         FieldPanel('landing_page_url'),
@@ -325,7 +355,16 @@ class DirectoryEntry(MetadataPageMixin, Page):
 
     def get_live_result(self):
         # Used in template to get the latest live result.
-        return self.results.filter(live=True).order_by('-result_last_seen').first()
+        return self.latest_live_result
+
+    def update_latest_live_result(self):
+        """Point `latest_live_result` at the latest live result of this
+        entry, looking it up from scratch"""
+        self.latest_live_result = ScanResult.objects.filter(
+            securedrop=self,
+            live=True,
+        ).order_by('-result_last_seen').first()
+        DirectoryEntry.objects.filter(pk=self.pk).update(latest_live_result=self.latest_live_result)
 
     def get_warnings(self, result):
         warnings = []
@@ -351,6 +390,7 @@ class DirectoryEntry(MetadataPageMixin, Page):
         from directory.models import ScanResult
         super(DirectoryEntry, self).save(*args, **kwargs)
         ScanResult.objects.filter(landing_page_url=self.landing_page_url).update(securedrop=self)
+        self.update_latest_live_result()
 
 
 @hooks.register('after_edit_page')
@@ -383,6 +423,174 @@ class SecuredropOwner(models.Model):
         return self.owner.email
 
 
+# Results of the checks of a scan, in the order of their bits in
+# ScanResult.checks.  The position of each check is stored in the database,
+# so new checks must only ever be appended.
+SCAN_CHECKS = (
+    # HTTPS checks formerly populated with pshtt
+    'forces_https',
+    'hsts',
+    'hsts_max_age',
+    'hsts_entire_domain',
+    'hsts_preloaded',
+
+    # Basic checks
+    'http_status_200_ok',
+    'no_cross_domain_redirects',
+    'expected_encoding',
+
+    # HTTP/2 support
+    'http2',
+
+    # Security headers
+    'no_server_info',
+    'no_server_version',
+    'csp_origin_only',
+    'mime_sniffing_blocked',
+    'noopen_download',
+    'xss_protection',
+    'clickjacking_protection',
+    'good_cross_domain_policy',
+    'http_1_0_caching_disabled',
+    'cache_control_set',
+    'cache_control_revalidate_set',
+    'cache_control_nocache_set',
+    'cache_control_notransform_set',
+    'cache_control_nostore_set',
+    'cache_control_private_set',
+    'expires_set',
+    'referrer_policy_set_to_no_referrer',
+
+    # Page content
+    'safe_onion_address',
+    'no_cdn',
+    'no_analytics',
+    'subdomain',
+    'no_cookies',
+    'no_cross_domain_assets',
+    # Whether the scanner stopped reading the landing page before its end,
+    # because it was too large or was not HTML
+    'body_truncated',
+    # Whether the scanner ran out of time searching the page's scripts for
+    # URLs, so that assets they load may be missing from the summaries
+    'script_scan_incomplete',
+)
+
+# Checks that are False rather than None on a new ScanResult
+CHECKS_FALSE_BY_DEFAULT = ('http2', 'body_truncated', 'script_scan_incomplete')
+
+
+def check_bit(name: str) -> int:
+    return 1 << SCAN_CHECKS.index(name)
+
+
+def packed_check(name: str) -> property:
+    """Accessor for the result of one of the SCAN_CHECKS of a ScanResult,
+    which is True, False, or None if the check was not made.  Each check
+    has a bit of `checks`, holding its result, and a bit of `checks_known`,
+    set if the check was made.
+
+    """
+    bit = check_bit(name)
+
+    def get_check(self):
+        if not self.checks_known & bit:
+            return None
+        return bool(self.checks & bit)
+
+    def set_check(self, value):
+        if value is None:
+            self.checks_known &= ~bit
+        else:
+            self.checks_known |= bit
+        if value:
+            self.checks |= bit
+        else:
+            self.checks &= ~bit
+
+    return property(get_check, set_check)
+
+
+def content_digest(text: str) -> uuid.UUID:
+    """A 128-bit digest of `text`, as stored in a UUIDField"""
+    return uuid.UUID(bytes=hashlib.sha256(text.encode('utf-8')).digest()[:16])
+
+
+class AssetSummary(models.Model):
+    """A summary of the cross-domain assets of a landing page, stored once
+    however many scan results it appears in.  Summaries are identified by
+    a digest of their text, so a scan result can refer to one without
+    looking it up first.
+
+    """
+    digest = models.UUIDField(primary_key=True, editable=False)
+    text = models.TextField()
+
+    @classmethod
+    def for_text(cls, text: str):
+        """An unsaved summary of `text`, or None for an empty summary"""
+        if not text:
+            return None
+        return cls(digest=content_digest(text), text=text)
+
+    def __str__(self):
+        return self.text
+
+
+def asset_summary_text(field_name: str) -> property:
+    """Accessor for the text of the AssetSummary that `field_name` of a
+    ScanResult refers to, which is empty if it refers to none"""
+
+    def get_text(self):
+        summary = getattr(self, field_name)
+        return summary.text if summary else ''
+
+    def set_text(self, text):
+        setattr(self, field_name, AssetSummary.for_text(text))
+
+    return property(get_text, set_text)
+
+
+# Fields of ScanResult that make up the result of a scan, from which its
+# fingerprint is computed.  Changing these changes the fingerprint of
+# every result, so that the next scan of each entry adds a new result.
+FINGERPRINT_FIELDS = (
+    'landing_page_url',
+    'redirect_target',
+    'live',
+    'checks',
+    'checks_known',
+    'asset_summary',
+    'ignored_asset_summary',
+    'analytics_trackers',
+)
+
+
+class ScanResultQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        save_asset_summaries(objs)
+        for result in objs:
+            # Also handled by ScanResult.save
+            result.compute_grade()
+            result.fingerprint = result.compute_fingerprint()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+def save_asset_summaries(results) -> None:
+    """Store the asset summaries of `results` that are not stored yet"""
+    summaries = {
+        summary.digest: summary
+        for result in results
+        for summary in (result.asset_summary, result.ignored_asset_summary)
+        if summary is not None and summary._state.adding
+    }
+    if summaries:
+        AssetSummary.objects.bulk_create(summaries.values(), ignore_conflicts=True)
+        for summary in summaries.values():
+            summary._state.adding = False
+
+
 class ScanResult(models.Model):
     # This is different from STN's Scan object in that each scan here will not
     # produce a new ScanResult row. If multiple consecutive scans have the same
@@ -413,70 +621,70 @@ class ScanResult(models.Model):
     # we store result_last_scan
     result_last_seen = models.DateTimeField(auto_now_add=True)
 
-    # HTTPS fields formerly populated with pshtt
-    forces_https = models.BooleanField(null=True)
-    hsts = models.BooleanField(null=True)
-    hsts_max_age = models.BooleanField(null=True)
-    hsts_entire_domain = models.BooleanField(null=True)
-    hsts_preloaded = models.BooleanField(null=True)
+    # Results of the checks listed in SCAN_CHECKS, packed into two
+    # integers rather than a column each, see `packed_check`
+    checks = models.BigIntegerField(default=0)
+    checks_known = models.BigIntegerField(
+        default=sum(check_bit(name) for name in CHECKS_FALSE_BY_DEFAULT),
+    )
 
-    # Basic checks
-    http_status_200_ok = models.BooleanField(null=True)
-    no_cross_domain_redirects = models.BooleanField(null=True)
-    expected_encoding = models.BooleanField(null=True)
+    # Summaries of the assets of the landing page that are loaded from
+    # other domains, or that are but were ignored, see
+    # `cross_domain_asset_summary` and `ignored_cross_domain_assets`
+    asset_summary = models.ForeignKey(
+        AssetSummary,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name='+',
+    )
+    ignored_asset_summary = models.ForeignKey(
+        AssetSummary,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name='+',
+    )
 
-    # HTTP/2 support
-    http2 = models.BooleanField(default=False)
+    # Names of the analytics services found on the landing page or in its
+    # scripts, separated by commas
+    analytics_trackers = models.TextField(default='', blank=True)
 
-    # Security headers
-    no_server_info = models.BooleanField(null=True)
-    no_server_version = models.BooleanField(null=True)
-    csp_origin_only = models.BooleanField(null=True)
-    mime_sniffing_blocked = models.BooleanField(null=True)
-    noopen_download = models.BooleanField(null=True)
-    xss_protection = models.BooleanField(null=True)
-    clickjacking_protection = models.BooleanField(null=True)
-    good_cross_domain_policy = models.BooleanField(null=True)
-    http_1_0_caching_disabled = models.BooleanField(null=True)
-    cache_control_set = models.BooleanField(null=True)
-    cache_control_revalidate_set = models.BooleanField(null=True)
-    cache_control_nocache_set = models.BooleanField(null=True)
-    cache_control_notransform_set = models.BooleanField(null=True)
-    cache_control_nostore_set = models.BooleanField(null=True)
-    cache_control_private_set = models.BooleanField(null=True)
-    expires_set = models.BooleanField(null=True)
-    referrer_policy_set_to_no_referrer = models.BooleanField(null=True)
+    grade = models.CharField(max_length=2, editable=False, default='?')
 
-    # Page content
-    safe_onion_address = models.BooleanField(null=True)
-    no_cdn = models.BooleanField(null=True)
-    no_analytics = models.BooleanField(null=True)
-    subdomain = models.BooleanField(null=True)
-    no_cookies = models.BooleanField(null=True)
-    no_cross_domain_assets = models.BooleanField(null=True)
-    cross_domain_asset_summary = models.TextField(default='', blank=True)
-    ignored_cross_domain_assets = models.TextField(default='', blank=True)
+    # Validators sent with the landing page, used to request it
+    # conditionally on the next scan
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=255, blank=True, default='')
 
-    grade = models.CharField(max_length=2, editable=False, default='?')
+    # Digest of the FINGERPRINT_FIELDS, equal for results that only differ
+    # in when they were seen
+    fingerprint = models.UUIDField(null=True, editable=False)
+
+    objects = ScanResultQuerySet.as_manager()
 
     class Meta:
         get_latest_by = 'result_last_seen'
         indexes = [
             models.Index(fields=['result_last_seen']),
+            models.Index(fields=['fingerprint']),
+            # For finding the latest live result of an entry
+            models.Index(fields=['securedrop', 'live', 'result_last_seen']),
         ]
 
-    def is_equal_to(self, other):
-        # We will use this equality method to compare the scan results only
+    cross_domain_asset_summary = asset_summary_text('asset_summary')
+    ignored_cross_domain_assets = asset_summary_text('ignored_asset_summary')
 
-        excluded_keys = ['_state', '_securedrop_cache', 'result_last_seen',
-                         'id', 'grade']
-
-        self_values_to_compare = [(k, v) for k, v in self.__dict__.items()
-                                  if k not in excluded_keys]
-        other_values_to_compare = [(k, v) for k, v in other.__dict__.items()
-                                   if k not in excluded_keys]
+    def compute_fingerprint(self) -> uuid.UUID:
+        values = [
+            getattr(self, self._meta.get_field(name).attname)
+            for name in FINGERPRINT_FIELDS
+        ]
+        return content_digest(json.dumps(values, default=str))
 
-        return self_values_to_compare == other_values_to_compare
+    def is_equal_to(self, other):
+        # We will use this equality method to compare the scan results only
+        return self.compute_fingerprint() == other.compute_fingerprint()
 
     def __str__(self):
         return 'Scan result for {}'.format(self.landing_page_url)
@@ -523,4 +731,16 @@ class ScanResult(models.Model):
     def save(self, *args, **kwargs):
         self.compute_grade()
         self.securedrop = DirectoryEntry.objects.filter(landing_page_url=self.landing_page_url).first()
-        super(ScanResult, self).save(*args, **kwargs)
+        save_asset_summaries([self])
+        self.fingerprint = self.compute_fingerprint()
+        # Point the entry at the result in the same transaction, so that
+        # anything run once the result is committed sees both
+        with transaction.atomic():
+            super(ScanResult, self).save(*args, **kwargs)
+            if self.live and self.securedrop:
+                DirectoryEntry.objects.filter(pk=self.securedrop.pk).update(latest_live_result=self)
+                self.securedrop.latest_live_result = self
+
+
+for check in SCAN_CHECKS:
+    setattr(ScanResult, check, packed_check(check))
@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from wagtail.signals import page_published, page_unpublished
+
+from directory.api.snapshot import refresh_snapshot
+from directory.models import DirectoryEntry, ScanResult
+
+
+@receiver([page_published, page_unpublished, post_delete], sender=DirectoryEntry)
+def refresh_snapshot_for_entries(sender, **kwargs):
+    """
+    Rewrite the static snapshot of the directory API once the change to
+    the entry is committed, so that it is never served out of date
+    """
+    transaction.on_commit(refresh_snapshot)
+
+
+@receiver(post_save, sender=ScanResult)
+def refresh_snapshot_for_scan_results(sender, instance, **kwargs):
+    """
+    Rewrite the static snapshot once a live scan result is committed,
+    since it becomes the latest scan of its entry. Results written in bulk
+    by the scan command send no signal, and it rewrites the snapshot itself.
+    """
+    if instance.live and instance.securedrop_id is not None:
+        transaction.on_commit(refresh_snapshot)
@@ -1,7 +1,19 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 from wagtail.models import Site
 
+from common.factories import CustomImageFactory
+from directory.models import DirectoryEntry, ScanResult
 from directory.tests.factories import (
     DirectoryPageFactory,
     DirectoryEntryFactory,
@@ -105,3 +117,374 @@ class ApiLatestScanResultTestCase(TestCase):
             'redirect_target': None,
             'grade': 'A',
         })
+
+
+class ApiQueryCountTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.directory = DirectoryPageFactory(
+            parent=Site.objects.get().root_page,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def add_entry(self):
+        entry = DirectoryEntryFactory(
+            parent=self.directory,
+            organization_logo=CustomImageFactory(),
+        )
+        ScanResultFactory(
+            landing_page_url=entry.landing_page_url,
+            securedrop=entry,
+            live=True,
+        )
+
+    def count_list_queries(self):
+        cache.clear()
+        # Renditions are created on first request, so do not count it
+        self.client.get(reverse('directoryentry-list'), format='json')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('directoryentry-list'), format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_queries_do_not_depend_on_number_of_entries(self):
+        self.add_entry()
+        one_entry = self.count_list_queries()
+        self.add_entry()
+        self.add_entry()
+
+        self.assertEqual(self.count_list_queries(), one_entry)
+
+
+class ApiCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.directory = DirectoryPageFactory(
+            parent=Site.objects.get().root_page,
+        )
+        cls.entry = DirectoryEntryFactory(parent=cls.directory)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_entry(self):
+        return self.client.get(reverse('directoryentry-list'), format='json').data[0]
+
+    def test_entries_are_served_from_cache(self):
+        self.get_entry()
+        DirectoryEntry.objects.filter(pk=self.entry.pk).update(
+            title='Changed without publishing',
+        )
+
+        self.assertEqual(self.get_entry()['title'], self.entry.title)
+
+    def test_cached_entry_is_replaced_on_publish(self):
+        self.get_entry()
+        self.entry.title = 'Republished'
+        self.entry.save_revision().publish()
+
+        self.assertEqual(self.get_entry()['title'], 'Republished')
+
+    def test_cached_entry_is_replaced_on_new_scan(self):
+        self.assertIsNone(self.get_entry()['latest_scan'])
+        ScanResultFactory(
+            landing_page_url=self.entry.landing_page_url,
+            securedrop=self.entry,
+            live=True,
+        )
+
+        self.assertIsNotNone(self.get_entry()['latest_scan'])
+
+
+class ApiConditionalRequestTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.directory = DirectoryPageFactory(
+            parent=Site.objects.get().root_page,
+        )
+        cls.entry = DirectoryEntryFactory(
+            parent=cls.directory,
+            last_published_at=timezone.now(),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.list_url = reverse('directoryentry-list')
+        self.detail_url = reverse('directoryentry-detail', args=[self.entry.pk])
+
+    def test_responses_have_validators(self):
+        for url in (self.list_url, self.detail_url):
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'].startswith('"'))
+
+        self.assertIn('Last-Modified', self.client.get(self.detail_url, format='json'))
+        self.assertNotIn('Last-Modified', self.client.get(self.list_url, format='json'))
+
+    def test_matching_etag_is_not_modified(self):
+        for url in (self.list_url, self.detail_url):
+            etag = self.client.get(url, format='json')['ETag']
+
+            with self.assertNumQueries(1):
+                response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+    def test_unchanged_since_last_modified_is_not_modified(self):
+        last_modified = self.client.get(self.detail_url, format='json')['Last-Modified']
+
+        response = self.client.get(
+            self.detail_url, format='json', HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_is_modified_after_unpublish(self):
+        DirectoryEntryFactory(
+            parent=self.directory,
+            last_published_at=self.entry.last_published_at - timedelta(days=1),
+        )
+        last_modified = http_date(self.entry.last_published_at.timestamp())
+        self.entry.unpublish()
+
+        response = self.client.get(
+            self.list_url, format='json', HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_etag_changes_on_new_scan(self):
+        etag = self.client.get(self.list_url, format='json')['ETag']
+        ScanResultFactory(
+            landing_page_url=self.entry.landing_page_url,
+            securedrop=self.entry,
+            live=True,
+        )
+
+        response = self.client.get(self.list_url, format='json', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_changes_on_unpublish(self):
+        DirectoryEntryFactory(parent=self.directory)
+        etag = self.client.get(self.list_url, format='json')['ETag']
+        self.entry.unpublish()
+
+        response = self.client.get(self.list_url, format='json', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_invalid_lookup_is_not_found(self):
+        response = self.client.get('/api/v1/directory/abc/', format='json')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_entry_is_not_found(self):
+        etag = self.client.get(self.detail_url, format='json')['ETag']
+        self.entry.unpublish()
+
+        response = self.client.get(self.detail_url, format='json', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 404)
+
+
+class ApiFieldSelectionTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.directory = DirectoryPageFactory(
+            parent=Site.objects.get().root_page,
+        )
+        cls.entry = DirectoryEntryFactory(parent=cls.directory)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **params):
+        return self.client.get(reverse('directoryentry-list'), params, format='json')
+
+    def test_only_selected_fields_are_included(self):
+        response = self.get(fields='landing_page_url,onion_address,onion_name')
+
+        self.assertEqual(dict(response.data[0]), {
+            'landing_page_url': self.entry.landing_page_url,
+            'onion_address': self.entry.full_onion_address,
+            'onion_name': self.entry.onion_name,
+        })
+
+    def test_selected_fields_are_taken_from_cached_entries(self):
+        self.get()
+
+        response = self.get(fields='title,slug')
+
+        self.assertEqual(dict(response.data[0]), {
+            'title': self.entry.title,
+            'slug': self.entry.slug,
+        })
+
+    def test_selected_fields_are_cheaper(self):
+        with CaptureQueriesContext(connection) as all_fields:
+            self.get()
+        cache.clear()
+        with CaptureQueriesContext(connection) as some_fields:
+            self.get(fields='landing_page_url,onion_address,onion_name')
+
+        self.assertLess(len(some_fields), len(all_fields))
+
+    def test_scan_can_be_left_out(self):
+        response = self.get(include_scan='false')
+
+        self.assertNotIn('latest_scan', response.data[0])
+        self.assertIn('title', response.data[0])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.get(fields='title,password')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail_fields_can_be_selected(self):
+        response = self.client.get(
+            reverse('directoryentry-detail', args=[self.entry.pk]),
+            {'fields': 'title'},
+            format='json',
+        )
+
+        self.assertEqual(dict(response.data), {'title': self.entry.title})
+
+
+class ApiPaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.directory = DirectoryPageFactory(
+            parent=Site.objects.get().root_page,
+        )
+        cls.entries = [DirectoryEntryFactory(parent=cls.directory) for _ in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_entries_are_not_paginated_by_default(self):
+        response = self.client.get(reverse('directoryentry-list'), format='json')
+
+        self.assertEqual(len(response.data), 3)
+
+    def test_pages_follow_primary_key(self):
+        first_page = self.client.get(
+            reverse('directoryentry-list'), {'page_size': 2, 'fields': 'slug'}, format='json',
+        )
+        second_page = self.client.get(first_page.data['next'], format='json')
+
+        self.assertEqual(
+            [entry['slug'] for entry in first_page.data['results'] + second_page.data['results']],
+            [entry.slug for entry in sorted(self.entries, key=lambda entry: entry.pk)],
+        )
+        self.assertIsNone(second_page.data['next'])
+
+
+class ScanHistoryTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.directory = DirectoryPageFactory(
+            parent=Site.objects.get().root_page,
+        )
+        cls.entry = DirectoryEntryFactory(parent=cls.directory)
+        cls.other_entry = DirectoryEntryFactory(parent=cls.directory)
+        cls.delisted_entry = DirectoryEntryFactory(parent=cls.directory, delisted='other')
+
+        cls.old_failure = cls.scan(cls.entry, days_ago=400, severe_warning=True)
+        cls.recent_pass = cls.scan(cls.entry, days_ago=2, no_failures=True)
+        cls.other_pass = cls.scan(cls.other_entry, days_ago=1, no_failures=True)
+        cls.scan(cls.delisted_entry, days_ago=1, no_failures=True)
+
+    @staticmethod
+    def scan(entry, days_ago, **kwargs):
+        result = ScanResultFactory(
+            landing_page_url=entry.landing_page_url,
+            securedrop=entry,
+            **kwargs
+        )
+        # result_last_seen is set on save, so override it after
+        result.result_last_seen = timezone.now() - timedelta(days=days_ago)
+        ScanResult.objects.filter(pk=result.pk).update(result_last_seen=result.result_last_seen)
+        return result
+
+    def get(self, **params):
+        return self.client.get(reverse('scanhistory-list'), params)
+
+    def rows(self, **params):
+        response = self.get(**params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_history_of_listed_entries_is_streamed_oldest_first(self):
+        rows = self.rows()
+
+        self.assertEqual(
+            [(row['entry'], row['grade']) for row in rows],
+            [(self.entry.slug, 'F'), (self.entry.slug, 'A'), (self.other_entry.slug, 'A')],
+        )
+        self.assertEqual(rows[0]['landing_page_url'], self.entry.landing_page_url)
+        self.assertIs(rows[0]['no_analytics'], False)
+
+    def test_history_can_be_filtered(self):
+        since = (timezone.now() - timedelta(days=30)).date().isoformat()
+        until = (timezone.now() - timedelta(days=2)).date().isoformat()
+
+        self.assertEqual(len(self.rows(since=since)), 2)
+        self.assertEqual(len(self.rows(until=until)), 2)
+        self.assertEqual(len(self.rows(since=since, until=until)), 1)
+        self.assertEqual(len(self.rows(grade='F')), 1)
+        self.assertEqual(len(self.rows(entry=self.other_entry.slug)), 1)
+
+    def test_history_days_are_whole_days_in_current_time_zone(self):
+        day = timezone.localdate() - timedelta(days=10)
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        for seen in (start - timedelta(seconds=1), start, start + timedelta(days=1, seconds=-1)):
+            result = self.scan(self.other_entry, days_ago=0, no_failures=True)
+            ScanResult.objects.filter(pk=result.pk).update(result_last_seen=seen)
+
+        rows = self.rows(since=day.isoformat(), until=day.isoformat())
+
+        self.assertEqual(len(rows), 2)
+
+    def test_history_days_are_compared_without_casting_results(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.rows(since='2020-01-01', until='2020-12-31')
+
+        self.assertNotIn('::date', queries[-1]['sql'])
+
+    def test_history_can_be_filtered_by_several_grades(self):
+        response = self.client.get(reverse('scanhistory-list') + '?grade=A&grade=F')
+
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(len(content.splitlines()), 3)
+
+    def test_history_as_csv(self):
+        response = self.get(format='csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[-1]['entry'], self.other_entry.slug)
+        self.assertEqual(rows[-1]['grade'], 'A')
+
+    def test_empty_history_as_csv_has_header(self):
+        response = self.get(format='csv', entry='no-such-entry')
+
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(content.splitlines()[0].split(',')[:2], ['entry', 'landing_page_url'])
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.get(grade='Z').status_code, 400)
+        self.assertEqual(self.get(since='yesterday').status_code, 400)
+        self.assertEqual(self.get(since='2020-02-01', until='2020-01-01').status_code, 400)
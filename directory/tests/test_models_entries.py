@@ -2,7 +2,7 @@ from django.core.exceptions import ValidationError
 from django.test import TestCase
 
 from directory.warnings import WarningLevel
-from directory.models import DirectoryEntry, ScanResult
+from directory.models import AssetSummary, DirectoryEntry, ScanResult
 from directory.tests.factories import DirectoryEntryFactory, ScanResultFactory
 
 
@@ -82,6 +82,25 @@ class DirectoryEntryTest(TestCase):
 
         self.assertEqual(r3, sd.get_live_result())
 
+    def test_live_result_kept_when_landing_page_goes_down(self):
+        sd = DirectoryEntryFactory()
+        live = ScanResultFactory(live=True, securedrop=sd, landing_page_url=sd.landing_page_url)
+        ScanResultFactory(live=False, securedrop=sd, landing_page_url=sd.landing_page_url)
+
+        sd = DirectoryEntry.objects.get(pk=sd.pk)
+
+        self.assertEqual(live, sd.get_live_result())
+
+    def test_save_looks_up_latest_live_result(self):
+        sd = DirectoryEntryFactory()
+        live = ScanResultFactory(live=True, securedrop=sd, landing_page_url=sd.landing_page_url)
+        DirectoryEntry.objects.filter(pk=sd.pk).update(latest_live_result=None)
+
+        sd = DirectoryEntry.objects.get(pk=sd.pk)
+        sd.save()
+
+        self.assertEqual(live, DirectoryEntry.objects.get(pk=sd.pk).get_live_result())
+
     def test_save_associates_results(self):
         landing_page_url = 'https://www.something.org'
         result = ScanResult(
@@ -227,6 +246,77 @@ class ScanResultTest(TestCase):
         result.save()
         self.assertEqual(result.securedrop, self.securedrop)
 
+    def test_checks_keep_true_false_and_unknown_results(self):
+        result = ScanResult(live=True, hsts=True, no_cookies=False, securedrop=self.securedrop)
+        result.save()
+
+        result = ScanResult.objects.get(pk=result.pk)
+        self.assertIs(result.hsts, True)
+        self.assertIs(result.no_cookies, False)
+        self.assertIsNone(result.forces_https)
+        self.assertIs(result.http2, False)
+
+        result.hsts = None
+        self.assertIsNone(result.hsts)
+        self.assertIs(result.no_cookies, False)
+
+    def test_asset_summaries_are_stored_once(self):
+        summary = 'https://example.com\n  * (img-src) https://example.org/a.gif\n'
+        for _ in range(2):
+            ScanResult(
+                live=True,
+                cross_domain_asset_summary=summary,
+                ignored_cross_domain_assets=summary,
+                landing_page_url=self.securedrop.landing_page_url,
+            ).save()
+        ScanResult.objects.bulk_create([
+            ScanResult(live=True, cross_domain_asset_summary=summary, securedrop=self.securedrop),
+        ])
+
+        self.assertEqual(AssetSummary.objects.count(), 1)
+        for result in ScanResult.objects.all():
+            self.assertEqual(result.cross_domain_asset_summary, summary)
+
+    def test_empty_asset_summaries_are_not_stored(self):
+        result = ScanResult(live=True, securedrop=self.securedrop)
+        result.save()
+
+        self.assertEqual(ScanResult.objects.get(pk=result.pk).cross_domain_asset_summary, '')
+        self.assertEqual(AssetSummary.objects.count(), 0)
+
+    def test_is_equal_to_compares_asset_summaries(self):
+        url = self.securedrop.landing_page_url
+        result1 = ScanResult(live=True, cross_domain_asset_summary='a', landing_page_url=url)
+        result1.save()
+        result1 = ScanResult.objects.get(pk=result1.pk)
+
+        self.assertTrue(result1.is_equal_to(
+            ScanResult(live=True, cross_domain_asset_summary='a', landing_page_url=url, securedrop=self.securedrop)
+        ))
+        self.assertFalse(result1.is_equal_to(
+            ScanResult(live=True, cross_domain_asset_summary='b', landing_page_url=url, securedrop=self.securedrop)
+        ))
+
+    def test_fingerprint_stored_on_save(self):
+        result = ScanResult(live=True, hsts=True, securedrop=self.securedrop)
+        result.save()
+        ScanResult.objects.bulk_create([ScanResult(live=True, hsts=True, securedrop=self.securedrop)])
+
+        fingerprints = ScanResult.objects.values_list('fingerprint', flat=True)
+        self.assertEqual(list(fingerprints), [result.compute_fingerprint()] * 2)
+
+    def test_fingerprint_ignores_when_and_how_result_was_seen(self):
+        result1 = ScanResult(live=True, hsts=True, etag='"a"', grade='A')
+        result2 = ScanResult(live=True, hsts=True, etag='"b"', grade='B')
+
+        self.assertEqual(result1.compute_fingerprint(), result2.compute_fingerprint())
+
+    def test_fingerprint_depends_on_checks(self):
+        result1 = ScanResult(live=True, hsts=True)
+        result2 = ScanResult(live=True, hsts=None)
+
+        self.assertNotEqual(result1.compute_fingerprint(), result2.compute_fingerprint())
+
 
 class SecuredropQuerySetTestCase(TestCase):
     def test_domain_annotation(self):
@@ -0,0 +1,90 @@
+import csv
+import gzip
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from directory.models import DirectoryEntry
+from directory.tests.factories import DirectoryEntryFactory, ScanResultFactory
+from directory.utils import directory_entry_fields, scan_csv, scan_result_fields
+
+
+class ScanCsvTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.scanned = DirectoryEntryFactory()
+        cls.result = ScanResultFactory(
+            landing_page_url=cls.scanned.landing_page_url,
+            securedrop=cls.scanned,
+            no_failures=True,
+        )
+        cls.unscanned = DirectoryEntryFactory()
+
+    def rows(self, content):
+        return list(csv.reader(StringIO(content)))
+
+    def test_rows_have_latest_live_result(self):
+        header, *rows = self.rows(scan_csv(DirectoryEntry.objects.order_by('pk')))
+
+        self.assertEqual(header, directory_entry_fields + scan_result_fields)
+        self.assertEqual(len(rows), 2)
+        scanned = dict(zip(header, rows[0]))
+        self.assertEqual(scanned['title'], self.scanned.title)
+        self.assertEqual(scanned['landing_page_url'], self.result.landing_page_url)
+        self.assertEqual(scanned['grade'], 'A')
+
+    def test_existing_columns_keep_their_positions(self):
+        self.assertEqual(scan_result_fields, [
+            'landing_page_url', 'redirect_target', 'live', 'result_last_seen',
+            'forces_https', 'hsts', 'hsts_max_age', 'hsts_entire_domain',
+            'hsts_preloaded', 'http_status_200_ok', 'no_cross_domain_redirects',
+            'expected_encoding', 'http2', 'no_server_info', 'no_server_version',
+            'csp_origin_only', 'mime_sniffing_blocked', 'noopen_download',
+            'xss_protection', 'clickjacking_protection', 'good_cross_domain_policy',
+            'http_1_0_caching_disabled', 'cache_control_set',
+            'cache_control_revalidate_set', 'cache_control_nocache_set',
+            'cache_control_notransform_set', 'cache_control_nostore_set',
+            'cache_control_private_set', 'expires_set',
+            'referrer_policy_set_to_no_referrer', 'safe_onion_address', 'no_cdn',
+            'no_analytics', 'subdomain', 'no_cookies', 'no_cross_domain_assets',
+            'cross_domain_asset_summary', 'ignored_cross_domain_assets', 'grade',
+            # Added since
+            'body_truncated', 'script_scan_incomplete', 'analytics_trackers',
+        ])
+
+    def test_entries_without_live_result_have_only_entry_fields(self):
+        rows = self.rows(scan_csv(DirectoryEntry.objects.order_by('pk')))
+
+        self.assertEqual(rows[2][0], self.unscanned.title)
+        self.assertEqual(len(rows[2]), len(directory_entry_fields))
+
+    def test_results_are_read_in_the_same_query_as_entries(self):
+        for _ in range(3):
+            entry = DirectoryEntryFactory()
+            ScanResultFactory(landing_page_url=entry.landing_page_url, securedrop=entry, live=True)
+
+        with self.assertNumQueries(1):
+            scan_csv(DirectoryEntry.objects.all())
+
+    def test_command_writes_gzipped_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'scans.csv.gz')
+
+            call_command('scanresultcsv', output=path)
+
+            with gzip.open(path, 'rt', newline='') as f:
+                self.assertEqual(f.read(), scan_csv(DirectoryEntry.objects.all()))
+
+    def test_command_writes_to_stdout(self):
+        stdout = StringIO()
+
+        call_command('scanresultcsv', stdout=stdout)
+
+        self.assertEqual(len(self.rows(stdout.getvalue())), 3)
+
+    def test_command_needs_file_for_gzip(self):
+        with self.assertRaises(CommandError):
+            call_command('scanresultcsv', gzip=True)
@@ -0,0 +1,160 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from wagtail.models import Site
+
+from directory.api.snapshot import read_manifest, write_snapshot
+from directory.api.viewsets import DirectoryEntriesViewSet
+from directory.tests.factories import (
+    DirectoryEntryFactory,
+    DirectoryPageFactory,
+    ScanResultFactory,
+)
+
+
+class SnapshotTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.directory = DirectoryPageFactory(
+            parent=Site.objects.get().root_page,
+        )
+        cls.entry = DirectoryEntryFactory(parent=cls.directory)
+
+    def setUp(self):
+        cache.clear()
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.root = temporary_directory.name
+        settings_override = override_settings(DIRECTORY_SNAPSHOT_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write(self):
+        return write_snapshot(DirectoryEntriesViewSet.queryset.all())
+
+    def read(self, manifest, name):
+        with open(os.path.join(self.root, manifest['version'], name)) as f:
+            plain = f.read()
+        with gzip.open(os.path.join(self.root, manifest['version'], name + '.gz'), 'rt') as f:
+            self.assertEqual(f.read(), plain)
+        return json.loads(plain)
+
+    def test_snapshot_matches_api(self):
+        live = self.client.get(reverse('directoryentry-list'), format='json').json()
+
+        manifest = self.write()
+
+        self.assertEqual(manifest['count'], 1)
+        self.assertEqual(read_manifest()['version'], manifest['version'])
+        self.assertEqual(self.read(manifest, 'directory.json'), live)
+        self.assertEqual(
+            self.read(manifest, 'directory/{}.json'.format(self.entry.pk)),
+            live[0],
+        )
+
+    def test_unchanged_snapshot_is_not_rewritten(self):
+        manifest = self.write()
+
+        self.assertEqual(self.write(), manifest)
+        self.assertCountEqual(os.listdir(self.root), ['current.json', manifest['version']])
+
+    def test_old_versions_are_pruned(self):
+        versions = []
+        for title in ('First', 'Second', 'Third'):
+            self.entry.title = title
+            self.entry.save()
+            cache.clear()
+            versions.append(self.write()['version'])
+
+        self.assertEqual(len(set(versions)), 3)
+        self.assertCountEqual(os.listdir(self.root), ['current.json'] + versions[1:])
+
+    def test_api_serves_snapshot_without_queries(self):
+        manifest = self.write()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('directoryentry-list'), format='json')
+            detail = self.client.get(
+                reverse('directoryentry-detail', args=[self.entry.pk]), format='json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"{}"'.format(manifest['version']))
+        self.assertEqual(response.json()[0]['title'], self.entry.title)
+        self.assertEqual(detail.json()['title'], self.entry.title)
+
+    def test_api_serves_gzipped_snapshot(self):
+        self.write()
+
+        response = self.client.get(
+            reverse('directoryentry-list'), format='json', HTTP_ACCEPT_ENCODING='gzip',
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))[0]['title'], self.entry.title)
+
+    def test_api_answers_conditional_requests_from_snapshot(self):
+        manifest = self.write()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('directoryentry-list'), format='json',
+                HTTP_IF_NONE_MATCH='"{}"'.format(manifest['version']),
+            )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_api_falls_back_to_database_without_snapshot(self):
+        response = self.client.get(reverse('directoryentry-list'), format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['title'], self.entry.title)
+
+    def test_missing_entry_falls_back_to_database(self):
+        self.write()
+
+        response = self.client.get(reverse('directoryentry-detail', args=[0]), format='json')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_publishing_entry_refreshes_snapshot(self):
+        manifest = self.write()
+        self.entry.title = 'Republished'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.save_revision().publish()
+
+        self.assertNotEqual(read_manifest()['version'], manifest['version'])
+        response = self.client.get(reverse('directoryentry-list'), format='json')
+        self.assertEqual(response.json()[0]['title'], 'Republished')
+
+    def test_new_live_scan_refreshes_snapshot(self):
+        self.write()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ScanResultFactory(
+                landing_page_url=self.entry.landing_page_url,
+                securedrop=self.entry,
+                live=True,
+            )
+
+        response = self.client.get(reverse('directoryentry-list'), format='json')
+        self.assertEqual(
+            response.json()[0]['latest_scan']['landing_page_url'],
+            self.entry.landing_page_url,
+        )
+
+    def test_command_writes_snapshot(self):
+        stdout = StringIO()
+
+        call_command('snapshotdirectory', root=self.root, stdout=stdout)
+
+        self.assertEqual(read_manifest()['count'], 1)
+        self.assertIn('Wrote snapshot', stdout.getvalue())
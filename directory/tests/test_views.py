@@ -5,7 +5,7 @@ from wagtail.test.utils import WagtailPageTestCase
 
 from directory.models import ScanResult
 from directory.wagtail_hooks import ScanResultAdmin
-from scanner.tests.test_scanner import mod_vcr
+from scanner.tests.test_scanner import mod_vcr, serial_asset_fetches
 
 
 VCR_DIR = os.path.join(os.path.dirname(__file__), 'scans_vcr')
@@ -23,6 +23,7 @@ class ManualScanTests(WagtailPageTestCase):
         response = self.client.get(self.view_url)
         self.assertEqual(response.status_code, 200)
 
+    @serial_asset_fetches
     @mod_vcr.use_cassette(
         os.path.join(VCR_DIR, 'manual-scan.yaml'),
         # Workaround for flickering test, see:
@@ -1,48 +1,87 @@
 import csv
 from io import StringIO
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterator, TextIO
 
-from directory.models.entry import ScanResult
+from directory.models.entry import SCAN_CHECKS, ScanResult
 
 if TYPE_CHECKING:
     from directory.models.entry import DirectoryEntryQuerySet  # noqa: F401
 
 
+#: Number of entries read from the database at a time when writing CSV
+CSV_CHUNK_SIZE = 2000
+
+
 #: List of field names on DirectoryEntry that should be included in CSV
 directory_entry_fields = ['title', 'onion_address', 'added']
 
 
+#: Attributes of ScanResult to include in CSV in place of fields that
+#: store them in another form
+packed_scan_result_fields = {
+    'checks': SCAN_CHECKS,
+    'checks_known': (),
+    'asset_summary': ('cross_domain_asset_summary',),
+    'ignored_asset_summary': ('ignored_cross_domain_assets',),
+}
+
+
+#: Fields of ScanResult that are the scanner's own bookkeeping rather than
+#: results, left out of CSV as they are of the API
+internal_scan_result_fields = ['securedrop', 'id', 'etag', 'last_modified', 'fingerprint']
+
+#: Attributes of ScanResult that were added to CSV later, which come after
+#: all the others so that existing columns keep their positions
+added_scan_result_fields = ['body_truncated', 'script_scan_incomplete', 'analytics_trackers']
+
 #: List of field names on ScanResult that should be included in CSV.
-#: This is all fields on the model except 'securedrop' and 'id'
-scan_result_fields = list(filter(
-    lambda x: x not in ['securedrop', 'id'],
-    (f.name for f in ScanResult._meta.get_fields())
-))
+#: This is all fields on the model except the internal ones, with the
+#: packed fields replaced by what they store
+scan_result_fields = [
+    name
+    for f in ScanResult._meta.get_fields()
+    if f.name not in internal_scan_result_fields
+    for name in packed_scan_result_fields.get(f.name, (f.name,))
+    if name not in added_scan_result_fields
+] + added_scan_result_fields
 
 
-def scan_csv(entries: 'DirectoryEntryQuerySet') -> str:
+def scan_csv_rows(entries: 'DirectoryEntryQuerySet') -> Iterator[list]:
     """
-    Turn a DirectoryEntryQuerySet into a CSV where each row has details from
-    an entry's most recent live scan
+    Yield a header row, then a row for each entry in a
+    DirectoryEntryQuerySet with details from its most recent live scan.
+    Entries are read from the database a chunk at a time, together with
+    their scans.
     """
+    yield directory_entry_fields + scan_result_fields
 
-    csv_output = StringIO()
-    csv_writer = csv.writer(csv_output)
-
-    # Write a header row
-    csv_writer.writerow(directory_entry_fields + scan_result_fields)
-
-    for entry in entries:
+    entries = entries.select_related(
+        'latest_live_result__asset_summary',
+        'latest_live_result__ignored_asset_summary',
+    )
+    for entry in entries.iterator(chunk_size=CSV_CHUNK_SIZE):
         # Get field values from DirectoryEntry
         values = [getattr(entry, field) for field in directory_entry_fields]
-        try:
-            # Add field values from ScanResult
-            result = entry.get_live_result()
+        result = entry.get_live_result()
+        # Write nothing more for an entry without a live scan result
+        if result is not None:
             values += [getattr(result, field) for field in scan_result_fields]
-        except ScanResult.DoesNotExist:
-            # If there's no scan result for the entry, swallow the exception
-            # and write nothing
-            pass
-        csv_writer.writerow(values)
+        yield values
 
+
+def write_scan_csv(entries: 'DirectoryEntryQuerySet', stream: TextIO) -> None:
+    """
+    Write a CSV of the most recent live scan of each entry in a
+    DirectoryEntryQuerySet to `stream`, a row at a time
+    """
+    csv.writer(stream).writerows(scan_csv_rows(entries))
+
+
+def scan_csv(entries: 'DirectoryEntryQuerySet') -> str:
+    """
+    Turn a DirectoryEntryQuerySet into a CSV where each row has details from
+    an entry's most recent live scan
+    """
+    csv_output = StringIO()
+    write_scan_csv(entries, csv_output)
     return csv_output.getvalue()
@@ -5,6 +5,7 @@ from wagtail.admin.viewsets.model import ModelViewSet
 from wagtail import hooks
 
 from .models import ScanResult
+from .utils import scan_result_fields
 from .views import ManualScanView
 
 
@@ -30,6 +31,8 @@ class ScanResultAdmin(ModelViewSet):
     )
     search_fields = ('landing_page_url', 'securedrop__title')
     inspect_view_enabled = True
+    # Show what the packed fields store rather than the fields themselves
+    inspect_view_fields = ['securedrop'] + scan_result_fields
 
     def get_common_view_kwargs(self, **kwargs):
         view_kwargs = super().get_common_view_kwargs(
@@ -1,24 +1,179 @@
-from collections import deque, namedtuple
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 import re
+import threading
+import time
 import urllib.parse
 
 import requests
 import tinycss2
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
 from bs4 import BeautifulSoup
 
+from scanner.parsing import PageTags, collect_soup_tags
+from scanner.trackers import find_script_trackers
 from scanner.utils import HEADERS
 from scanner.utils import extract_strings, extract_urls
 
 
 Asset = namedtuple('Asset', ['resource', 'kind', 'initiator'])
 
+# What the scanner takes from the body of an external script or
+# stylesheet: the URLs referenced within it, and the names of the
+# analytics services whose signatures it contains
+LinkedAsset = namedtuple('LinkedAsset', ['urls', 'trackers'])
 
-def extract_assets(soup: BeautifulSoup, site_url: str) -> List[Asset]:
+# Maximum number of external scripts and stylesheets fetched at once for a
+# single page, and the number of seconds allowed for all of them to finish.
+ASSET_FETCH_CONCURRENCY = 8
+ASSET_FETCH_DEADLINE = 15
+
+# Number of external scripts and stylesheets whose URLs are remembered by
+# an AssetCache.
+ASSET_CACHE_SIZE = 2000
+
+# Number of characters at the start of each script that are searched for
+# URLs, and the number of seconds allowed for searching all the scripts of
+# a single page.
+SCRIPT_SCAN_LIMIT = 1024 * 1024
+SCRIPT_SCAN_BUDGET = 5
+
+
+class TimeBudget:
+    """A number of seconds allowed for some work, counted from the first
+    time the budget is checked.  `ran_out` is set by work that was cut
+    short because the budget was exhausted.
+
+    """
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.ran_out = False
+        self._deadline = None
+
+    def exhausted(self) -> bool:
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now + self.seconds
+        return now > self._deadline
+
+
+class AssetCache:
+    """Least-recently-used cache of what was found in external scripts and
+    stylesheets, keyed by the kind of asset and its resolved URL.  Meant to
+    live for one scan run, so that assets shared between landing pages,
+    such as CDN-hosted libraries, are only fetched and parsed once.
+
+    """
+
+    def __init__(self, maxsize: int = ASSET_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._assets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, asset_url: str) -> Optional[LinkedAsset]:
+        key = (kind, normalize_asset_url(asset_url))
+        with self._lock:
+            try:
+                linked_asset = self._assets[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._assets.move_to_end(key)
+            self.hits += 1
+            return linked_asset
+
+    def set(self, kind: str, asset_url: str, linked_asset: LinkedAsset) -> None:
+        key = (kind, normalize_asset_url(asset_url))
+        with self._lock:
+            self._assets[key] = linked_asset
+            self._assets.move_to_end(key)
+            while len(self._assets) > self.maxsize:
+                self._assets.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._assets),
+        }
+
+
+def extract_assets(
+        soup: BeautifulSoup,
+        site_url: str,
+        fetch_concurrency: Optional[int] = None,
+        fetch_deadline: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+        cache: Optional[AssetCache] = None,
+        trackers: Optional[Set[str]] = None,
+        script_scan_budget: Optional[float] = None,
+        budget: Optional[TimeBudget] = None,
+) -> List[Asset]:
+    """Return the assets loaded by a page that has been parsed with
+    BeautifulSoup.  See `extract_tag_assets`."""
+    return extract_tag_assets(
+        collect_soup_tags(soup),
+        site_url,
+        fetch_concurrency=fetch_concurrency,
+        fetch_deadline=fetch_deadline,
+        session=session,
+        cache=cache,
+        trackers=trackers,
+        script_scan_budget=script_scan_budget,
+        budget=budget,
+    )
+
+
+def extract_tag_assets(
+        tags: PageTags,
+        site_url: str,
+        fetch_concurrency: Optional[int] = None,
+        fetch_deadline: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+        cache: Optional[AssetCache] = None,
+        trackers: Optional[Set[str]] = None,
+        script_scan_budget: Optional[float] = None,
+        budget: Optional[TimeBudget] = None,
+) -> List[Asset]:
+    """Return the assets loaded by a page, given its tags as collected by
+    one of the backends in `scanner.parsing`.  If a set is given as
+    `trackers`, the names of the analytics services found in the external
+    scripts of the page are added to it.
+
+    Searching the page's scripts for URLs stops once `script_scan_budget`
+    seconds have been spent on it, defaulting to SCRIPT_SCAN_BUDGET.  The
+    clock starts after the external scripts have been fetched.  A
+    TimeBudget may be given as `budget` instead, to tell afterwards from
+    its `ran_out` whether some of the scripts were not searched fully."""
+    if budget is None:
+        if script_scan_budget is None:
+            script_scan_budget = SCRIPT_SCAN_BUDGET
+        budget = TimeBudget(script_scan_budget)
     assets = []
 
-    images = soup.find_all('img')
-    for image in images:
+    # Fetch external scripts and stylesheets up front and concurrently,
+    # then walk the page in its usual order so that the list of assets
+    # does not depend on which fetch finished first.
+    scripts = tags['script']
+    stylesheet_links = tags['stylesheet']
+    linked_assets = fetch_linked_assets(
+        [('script', script.attrs['src']) for script in scripts if 'src' in script.attrs] +
+        [('style', link.attrs['href']) for link in stylesheet_links if link.attrs.get('href')],
+        site_url,
+        concurrency=fetch_concurrency,
+        deadline=fetch_deadline,
+        session=session,
+        cache=cache,
+        budget=budget,
+    )
+    if trackers is not None:
+        for linked_asset in linked_assets.values():
+            trackers.update(linked_asset.trackers)
+
+    for image in tags['img']:
         if 'src' in image.attrs:
             assets.append(
                 Asset(
@@ -38,7 +193,7 @@ def extract_assets(soup: BeautifulSoup, site_url: str) -> List[Asset]:
                     )
                 )
 
-    for video in soup.find_all('video'):
+    for video in tags['video']:
         if 'src' in video.attrs:
             assets.append(
                 Asset(
@@ -59,7 +214,7 @@ def extract_assets(soup: BeautifulSoup, site_url: str) -> List[Asset]:
     # scan all simple tags that only have resources referenced in the
     # "src" attribute.
     for tag_name in ('source', 'audio', 'embed'):
-        for tag in soup.find_all(tag_name):
+        for tag in tags[tag_name]:
             if 'src' in tag.attrs:
                 assets.append(
                     Asset(
@@ -69,7 +224,6 @@ def extract_assets(soup: BeautifulSoup, site_url: str) -> List[Asset]:
                     )
                 )
 
-    scripts = soup.find_all('script')
     for script in scripts:
         if 'src' in script.attrs:
             # externally loaded js
@@ -81,51 +235,55 @@ def extract_assets(soup: BeautifulSoup, site_url: str) -> List[Asset]:
                 )
             )
 
-            response = fetch_asset(script.attrs['src'], site_url)
             # assets in content from external js
-            for text in extract_strings(response.text):
-                for url in extract_urls(text):
-                    assets.append(Asset(resource=url, kind='script-resource', initiator=script.attrs['src']))
+            for url in linked_assets[('script', script.attrs['src'])].urls:
+                assets.append(Asset(resource=url, kind='script-resource', initiator=script.attrs['src']))
         # js embedded in <script> tags
         else:
-            for text in extract_strings(script.get_text()):
-                for url in extract_urls(text):
-                    assets.append(
-                        Asset(resource=url, kind='script-embed', initiator=site_url)
-                    )
+            for url in urls_from_script(script.text, budget=budget):
+                assets.append(
+                    Asset(resource=url, kind='script-embed', initiator=site_url)
+                )
 
-    iframe_tags = soup.find_all('iframe')
-    for tag in iframe_tags:
-        if tag.has_attr('src'):
+    for tag in tags['iframe']:
+        if 'src' in tag.attrs:
             assets.append(Asset(resource=tag.attrs['src'], kind='iframe-src', initiator=site_url))
 
-    stylesheet_links = soup.find_all('link', rel='stylesheet')
     for link in stylesheet_links:
         if link.attrs.get('href'):
-            response = fetch_asset(link.attrs['href'], site_url)
             # assets in content from stylesheet link
-            for url in urls_from_css(response.text):
+            for url in linked_assets[('style', link.attrs['href'])].urls:
                 assets.append(Asset(resource=url, kind='style-resource', initiator=link.attrs['href']))
 
             # stylesheet link
             assets.append(Asset(resource=link.attrs['href'], kind='style-href', initiator=site_url))
 
     # css embedded in <style> tags
-    style_tags = soup.find_all('style')
-    for tag in style_tags:
-        for item in tag.contents:
-            if isinstance(item, str):
-                for url in urls_from_css(item):
-                    assets.append(Asset(resource=url, kind='style-embed', initiator=site_url))
+    for tag in tags['style']:
+        for url in urls_from_css(tag.text):
+            assets.append(Asset(resource=url, kind='style-embed', initiator=site_url))
 
     # inline styles
-    for tag in soup.select('[style]'):
+    for tag in tags['inline-style']:
         for url in urls_from_css_declarations(tag.attrs['style']):
             assets.append(Asset(resource=url, kind='style-resource-inline', initiator=site_url))
 
     return assets
 
 
+def urls_from_script(js_text: str, budget: Optional[TimeBudget] = None) -> List[str]:
+    """Given JavaScript text, return all URLs found in its string literals.
+    Only the first SCRIPT_SCAN_LIMIT characters are searched, and the
+    search stops early once `budget` is exhausted, setting its `ran_out`."""
+    urls = []
+    for text in extract_strings(js_text[:SCRIPT_SCAN_LIMIT]):
+        if budget is not None and budget.exhausted():
+            budget.ran_out = True
+            break
+        urls.extend(extract_urls(text))
+    return urls
+
+
 def urls_from_css_declarations(css_text: str) -> List[str]:
     """Parse text consisting of one or more CSS declarations and return a
     list of urls found within.  The CSS text given should not include
@@ -170,7 +328,11 @@ def descendants(nodes):
     return children
 
 
-def fetch_asset(asset_url: str, site_url: str) -> requests.models.Response:
+def resolve_asset_url(asset_url: str, site_url: str) -> str:
+    """Fill in the scheme and host of an asset URL from the URL of the page
+    that loads it.
+
+    """
     site_url = urllib.parse.urlparse(site_url)
     asset_url = urllib.parse.urlparse(asset_url)
 
@@ -179,9 +341,126 @@ def fetch_asset(asset_url: str, site_url: str) -> requests.models.Response:
     if not asset_url.netloc:
         asset_url = asset_url._replace(netloc=site_url.netloc)
 
+    return asset_url.geturl()
+
+
+def normalize_asset_url(asset_url: str) -> str:
+    """Lower-case the scheme and host of a URL and drop its fragment, which
+    is never sent to the server.
+
+    """
+    parts = urllib.parse.urlsplit(asset_url)
+    return urllib.parse.urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, '')
+    )
+
+
+def fetch_asset(
+        asset_url: str,
+        site_url: str,
+        session: Optional[requests.Session] = None,
+) -> requests.models.Response:
     # Note: headers include User-Agent which is required for correct
     # scanning.
-    return requests.get(asset_url.geturl(), headers=HEADERS, timeout=5)
+    return (session or requests).get(resolve_asset_url(asset_url, site_url), headers=HEADERS, timeout=5)
+
+
+def fetch_assets(
+        asset_urls: List[str],
+        site_url: str,
+        concurrency: Optional[int] = None,
+        deadline: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+) -> Dict[str, Optional[str]]:
+    """Fetch several assets of a page concurrently and return the text of
+    each, keyed by the URL as given.  At most `concurrency` requests are
+    made at once.  Assets that have not been fetched within `deadline`
+    seconds map to None.  Both default to the module-level
+    ASSET_FETCH_CONCURRENCY and ASSET_FETCH_DEADLINE.  Errors raised while
+    fetching an asset are re-raised, as with `fetch_asset`.
+
+    """
+    if concurrency is None:
+        concurrency = ASSET_FETCH_CONCURRENCY
+    if deadline is None:
+        deadline = ASSET_FETCH_DEADLINE
+
+    unique_urls = list(dict.fromkeys(asset_urls))
+    if not unique_urls:
+        return {}
+
+    executor = ThreadPoolExecutor(max_workers=max(min(concurrency, len(unique_urls)), 1))
+    try:
+        futures = {
+            url: executor.submit(fetch_asset, url, site_url, session)
+            for url in unique_urls
+        }
+        done, _ = wait(futures.values(), timeout=deadline)
+        return {
+            url: future.result().text if future in done else None
+            for url, future in futures.items()
+        }
+    finally:
+        # Don't wait on fetches that missed the deadline; each one is
+        # still bounded by its own request timeout.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_linked_asset(kind: str, text: str, budget: Optional[TimeBudget] = None) -> LinkedAsset:
+    """Extract what the scanner looks for from the body of an external
+    script or stylesheet.  Only scripts are checked for analytics, and
+    searching them for URLs stops early once `budget` is exhausted."""
+    if kind == 'script':
+        return LinkedAsset(
+            urls=urls_from_script(text, budget=budget),
+            trackers=frozenset(find_script_trackers(text)),
+        )
+    return LinkedAsset(urls=urls_from_css(text), trackers=frozenset())
+
+
+def fetch_linked_assets(
+        linked_assets: List[Tuple[str, str]],
+        site_url: str,
+        concurrency: Optional[int] = None,
+        deadline: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+        cache: Optional[AssetCache] = None,
+        budget: Optional[TimeBudget] = None,
+) -> Dict[Tuple[str, str], LinkedAsset]:
+    """Given `(kind, asset_url)` pairs for the external scripts and
+    stylesheets of a page, return what was found within each of them,
+    keyed by the same pairs.  Assets found in `cache` are not fetched
+    again, and newly fetched ones are added to it.  See
+    `parse_linked_asset` for `budget`.
+
+    """
+    parsed = {}
+    to_fetch = []
+    for kind, asset_url in dict.fromkeys(linked_assets):
+        cached = None
+        if cache is not None:
+            cached = cache.get(kind, resolve_asset_url(asset_url, site_url))
+        if cached is None:
+            to_fetch.append((kind, asset_url))
+        else:
+            parsed[(kind, asset_url)] = cached
+
+    fetched = fetch_assets(
+        [asset_url for _, asset_url in to_fetch],
+        site_url,
+        concurrency=concurrency,
+        deadline=deadline,
+        session=session,
+    )
+    for kind, asset_url in to_fetch:
+        text = fetched[asset_url]
+        parsed[(kind, asset_url)] = parse_linked_asset(kind, text or '', budget=budget)
+        # Don't remember assets that missed the deadline, or that may not
+        # have been searched fully
+        if cache is not None and text is not None and not (budget and budget.exhausted()):
+            cache.set(kind, resolve_asset_url(asset_url, site_url), parsed[(kind, asset_url)])
+
+    return parsed
 
 
 def parse_srcset(srcset: str) -> List[str]:
@@ -0,0 +1,164 @@
+"""Benchmarks of the scanner's parsing of landing pages, run against the
+pages recorded in the scanner's test cassettes.  No requests are made.
+Run with:
+
+    python -m scanner.benchmarks
+
+"""
+import glob
+import os
+import timeit
+import zlib
+import random
+from typing import Iterable, Iterator, List, Tuple
+
+import yaml
+from bs4 import BeautifulSoup
+
+from scanner.parsing import (
+    COLLECTED_TAGS,
+    PARSER_BACKENDS,
+    PageTags,
+    collect_soup_tags,
+    soup_tag,
+)
+from scanner.utils import WEB_URL_REGEX, extract_strings, extract_urls
+
+
+VCR_DIR = os.path.join(os.path.dirname(__file__), 'tests', 'scans_vcr')
+
+
+def fixture_pages(vcr_dir: str = VCR_DIR) -> Iterator[Tuple[str, bytes]]:
+    """Yield the URL and body of every distinct HTML response recorded in
+    the cassettes in `vcr_dir`"""
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(vcr_dir, '*.yaml'))):
+        with open(path) as f:
+            cassette = yaml.safe_load(f)
+        for interaction in cassette['interactions']:
+            url = interaction['request']['uri']
+            response = interaction['response']
+            headers = {key.lower(): values[0] for key, values in response['headers'].items()}
+            body = response['body'].get('string') or b''
+            if url in seen or 'html' not in headers.get('content-type', '') or not body:
+                continue
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            if headers.get('content-encoding') == 'gzip':
+                body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+            seen.add(url)
+            yield url, body
+
+
+def fixture_scripts(vcr_dir: str = VCR_DIR) -> Iterator[Tuple[str, str]]:
+    """Yield the URL and text of every distinct inline or external script
+    recorded in the cassettes in `vcr_dir`"""
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(vcr_dir, '*.yaml'))):
+        with open(path) as f:
+            cassette = yaml.safe_load(f)
+        for interaction in cassette['interactions']:
+            url = interaction['request']['uri']
+            response = interaction['response']
+            headers = {key.lower(): values[0] for key, values in response['headers'].items()}
+            body = response['body'].get('string') or b''
+            if url in seen or 'javascript' not in headers.get('content-type', '') or not body:
+                continue
+            if headers.get('content-encoding') == 'gzip':
+                body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+            seen.add(url)
+            yield url, body.decode('utf-8', 'replace') if isinstance(body, bytes) else body
+    for url, body in fixture_pages(vcr_dir):
+        for tag in PARSER_BACKENDS['lxml'](body)['script']:
+            if tag.text:
+                yield url, tag.text
+
+
+# Characters and schemes that the parts of WEB_URL_REGEX treat
+# differently, for generating strings to compare extract_urls against it
+FUZZ_TOKENS = list('ahpstz09.-/:?_=;A é"') + ['http://', 'https://']
+
+
+def fuzz_strings(count: int, max_length: int = 60, seed: int = 0) -> Iterator[str]:
+    """Yield `count` random strings, reproducibly for a given `seed`"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield ''.join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(0, max_length)))
+
+
+def url_extraction_mismatches(texts: Iterable[str]) -> Iterator[Tuple[str, List[str], List[str]]]:
+    """Yield each text for which extract_urls finds different URLs than
+    matching WEB_URL_REGEX, with the URLs found by each"""
+    for text in texts:
+        urls = extract_urls(text)
+        regex_urls = WEB_URL_REGEX.findall(text)
+        if urls != regex_urls:
+            yield text, urls, regex_urls
+
+
+def benchmark_url_extraction(number: int = 5) -> None:
+    """Time extract_urls against WEB_URL_REGEX on the string literals of
+    every fixture script, after checking that they agree on them and on
+    random strings, then on a string the regex backtracks a lot on"""
+    corpus = [text for _, script in fixture_scripts() for text in extract_strings(script)]
+    for text, urls, regex_urls in url_extraction_mismatches(corpus + list(fuzz_strings(10000))):
+        raise AssertionError('URLs extracted from {!r} differ: {} != {}'.format(text, urls, regex_urls))
+
+    pathological = 'a-' * 10000
+    print('{:<40} {:>12} {:>12} {:>8}'.format('input', 'regex ms', 'tokenizer ms', 'speedup'))
+    for name, texts in (('fixture string literals', corpus), ('"a-" * 10000', [pathological])):
+        regex_time = timeit.timeit(
+            lambda: [WEB_URL_REGEX.findall(text) for text in texts], number=number,
+        ) / number
+        tokenizer_time = timeit.timeit(
+            lambda: [extract_urls(text) for text in texts], number=number,
+        ) / number
+        print('{:<40} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            name, regex_time * 1000, tokenizer_time * 1000, regex_time / tokenizer_time,
+        ))
+
+
+def find_all_tags(soup: BeautifulSoup) -> PageTags:
+    """Equivalent of `collect_soup_tags` making a separate search of the
+    page for each kind of tag, as the scanner used to"""
+    tags = {name: soup.find_all(name) for name in COLLECTED_TAGS}
+    tags['stylesheet'] = soup.find_all('link', rel='stylesheet')
+    tags['inline-style'] = soup.select('[style]')
+    return {name: [soup_tag(tag) for tag in group] for name, group in tags.items()}
+
+
+def benchmark_collect_tags(number: int = 20) -> None:
+    print('{:<60} {:>12} {:>12} {:>8}'.format('page', 'find_all ms', 'walk ms', 'speedup'))
+    for url, body in fixture_pages():
+        soup = BeautifulSoup(body, 'lxml')
+        if find_all_tags(soup) != collect_soup_tags(soup):
+            raise AssertionError('Tags collected from {} differ'.format(url))
+
+        find_all_time = timeit.timeit(lambda: find_all_tags(soup), number=number) / number
+        walk_time = timeit.timeit(lambda: collect_soup_tags(soup), number=number) / number
+        print('{:<60} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            url[:60], find_all_time * 1000, walk_time * 1000, find_all_time / walk_time,
+        ))
+
+
+def benchmark_parser_backends(number: int = 20) -> None:
+    """Time parsing each page and collecting its tags with every parser
+    backend, relative to the BeautifulSoup one"""
+    backends = sorted(PARSER_BACKENDS, key=lambda backend: backend != 'soup')
+    print('{:<60}'.format('page') + ''.join('{:>12}'.format(backend + ' ms') for backend in backends))
+    for url, body in fixture_pages():
+        times = [
+            timeit.timeit(lambda: PARSER_BACKENDS[backend](body), number=number) / number
+            for backend in backends
+        ]
+        print('{:<60}'.format(url[:60]) + ''.join(
+            '{:>12.2f}'.format(backend_time * 1000) for backend_time in times
+        ) + '  ({:.1f}x)'.format(times[0] / min(times)))
+
+
+if __name__ == '__main__':
+    benchmark_collect_tags()
+    print()
+    benchmark_parser_backends()
+    print()
+    benchmark_url_extraction()
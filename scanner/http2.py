@@ -1,9 +1,19 @@
 import socket
 import ssl
+from typing import MutableMapping, Optional
 from urllib.parse import urlparse
 
 
-def check_http2(domain_name):
+HTTP2_CHECK_TIMEOUT = 5
+
+
+def alpn_context():
+    ctx = ssl.create_default_context()
+    ctx.set_alpn_protocols(['h2', 'spdy/3', 'http/1.1'])
+    return ctx
+
+
+def check_http2(domain_name, cache: Optional[MutableMapping[str, bool]] = None):
     """Check for support of the HTTP/2 protocol for a given domain.
 
     This function attempts to connect to the given domain over SSL,
@@ -11,25 +21,25 @@ def check_http2(domain_name):
     The return value is a dictionary of ScanResult attributes
     describing if the protocol is supported or not.
 
+    If a `cache` mapping is given, results are looked up in and stored to
+    it by host, so that each host is only checked once.
+
     """
-    socket.setdefaulttimeout(5)
+    host = urlparse(domain_name).netloc
+    if cache is not None and host in cache:
+        return {'http2': cache[host]}
+
     try:
-        host = urlparse(domain_name).netloc
         port = 443
 
-        ctx = ssl.create_default_context()
-        ctx.set_alpn_protocols(['h2', 'spdy/3', 'http/1.1'])
-
-        conn = ctx.wrap_socket(
-            socket.socket(socket.AF_INET, socket.SOCK_STREAM), server_hostname=host
-        )
-        conn.connect((host, port))
+        with socket.create_connection((host, port), timeout=HTTP2_CHECK_TIMEOUT) as sock:
+            with alpn_context().wrap_socket(sock, server_hostname=host) as conn:
+                selected_protocol = conn.selected_alpn_protocol()
 
-        selected_protocol = conn.selected_alpn_protocol()
-
-        if selected_protocol == 'h2':
-            return {'http2': True}
-        else:
-            return {'http2': False}
+        http2 = selected_protocol == 'h2'
     except Exception:
-        return {'http2': False}
+        http2 = False
+
+    if cache is not None:
+        cache[host] = http2
+    return {'http2': http2}
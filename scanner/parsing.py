@@ -0,0 +1,135 @@
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional
+
+import lxml.etree
+import lxml.html
+from bs4 import BeautifulSoup, Tag
+from bs4.dammit import EncodingDetector
+
+
+# A tag of a page, reduced to what the scanner looks at.  `attrs` maps
+# attribute names to string values, and `text` is the text content of
+# <script> and <style> tags and empty for all others.
+PageTag = namedtuple('PageTag', ['name', 'attrs', 'text'])
+PageTags = Dict[str, List[PageTag]]
+
+# Names of the tags, besides stylesheet links and tags with inline
+# styles, that are collected from a page by the parser backends
+COLLECTED_TAGS = frozenset((
+    'a', 'img', 'video', 'source', 'audio', 'embed', 'script', 'iframe', 'style',
+))
+
+# Tags whose text content is kept
+TEXT_TAGS = frozenset(('script', 'style'))
+
+
+def group_tags(tags: Iterable[PageTag]) -> PageTags:
+    """Group the tags of a page, in document order, by tag name.
+    Stylesheet links are grouped under 'stylesheet', and tags with a
+    `style` attribute under 'inline-style'.
+
+    """
+    groups = {name: [] for name in COLLECTED_TAGS | {'stylesheet', 'inline-style'}}
+    for tag in tags:
+        if tag.name in COLLECTED_TAGS:
+            groups[tag.name].append(tag)
+        elif tag.name == 'link' and 'stylesheet' in tag.attrs.get('rel', '').split():
+            groups['stylesheet'].append(tag)
+        if 'style' in tag.attrs:
+            groups['inline-style'].append(tag)
+    return groups
+
+
+def soup_tag(tag: Tag) -> PageTag:
+    # BeautifulSoup splits multi-valued attributes such as rel into lists
+    attrs = {
+        name: ' '.join(value) if isinstance(value, list) else value
+        for name, value in tag.attrs.items()
+    }
+    if tag.name == 'script':
+        text = tag.get_text()
+    elif tag.name == 'style':
+        text = ''.join(item for item in tag.contents if isinstance(item, str))
+    else:
+        text = ''
+    return PageTag(name=tag.name, attrs=attrs, text=text)
+
+
+def collect_soup_tags(soup: BeautifulSoup) -> PageTags:
+    """Walk an already parsed page once and return the tags the scanner
+    looks at, grouped as by `group_tags`"""
+    return group_tags(
+        soup_tag(tag) for tag in soup.descendants if isinstance(tag, Tag)
+    )
+
+
+def parse_soup_tags(content: bytes, encoding: Optional[str] = None) -> PageTags:
+    """Parse a page with BeautifulSoup and return the tags the scanner
+    looks at.  Slower than `parse_lxml_tags`, but copes with any input.
+    `encoding` is the character set of the page given by its response
+    headers, if any; otherwise it is worked out from the page itself."""
+    return collect_soup_tags(BeautifulSoup(content, "lxml", from_encoding=encoding))
+
+
+def lxml_tag(element: lxml.html.HtmlElement) -> PageTag:
+    return PageTag(
+        name=element.tag,
+        attrs=dict(element.attrib),
+        text=''.join(element.itertext()) if element.tag in TEXT_TAGS else '',
+    )
+
+
+def lxml_parser(content: bytes, encoding: Optional[str] = None) -> lxml.html.HTMLParser:
+    """Return an lxml parser for a page that decodes it as BeautifulSoup
+    would: as `encoding` if given, or else as the page declares or as its
+    bytes suggest.  Left to itself, lxml reads pages that declare no
+    encoding as Latin-1."""
+    detector = EncodingDetector(
+        content,
+        known_definite_encodings=[encoding] if encoding else None,
+        is_html=True,
+    )
+    for candidate in detector.encodings:
+        try:
+            return lxml.html.HTMLParser(encoding=candidate)
+        except LookupError:
+            # Not an encoding Python knows of, try the next guess
+            continue
+    return lxml.html.HTMLParser()
+
+
+def parse_lxml_tags(content: bytes, encoding: Optional[str] = None) -> PageTags:
+    """Parse a page with lxml and return the tags the scanner looks at,
+    without building a BeautifulSoup tree.  Pages that lxml cannot make a
+    document of are parsed with BeautifulSoup instead.  See
+    `parse_soup_tags` for `encoding`.
+
+    """
+    try:
+        root = lxml.html.document_fromstring(content, parser=lxml_parser(content, encoding))
+    except (lxml.etree.ParserError, lxml.etree.XMLSyntaxError):
+        return parse_soup_tags(content, encoding)
+    return group_tags(
+        # Skip comments and processing instructions, whose tag is a function
+        lxml_tag(element) for element in root.iter() if isinstance(element.tag, str)
+    )
+
+
+PARSER_BACKENDS: Dict[str, Callable[[bytes, Optional[str]], PageTags]] = {
+    'lxml': parse_lxml_tags,
+    'soup': parse_soup_tags,
+}
+
+# Backend used by parse_page unless another is given
+DEFAULT_PARSER_BACKEND = 'lxml'
+
+
+def parse_page(
+        content: bytes,
+        encoding: Optional[str] = None,
+        backend: Optional[str] = None,
+) -> PageTags:
+    """Parse the body of a page with one of the PARSER_BACKENDS and return
+    the tags the scanner looks at.  See `parse_soup_tags` for
+    `encoding`."""
+    return PARSER_BACKENDS[backend or DEFAULT_PARSER_BACKEND](content, encoding)
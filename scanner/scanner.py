@@ -1,33 +1,75 @@
+import asyncio
 from bs4 import BeautifulSoup
 import requests
 import re
 import itertools
 import operator
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
-from typing import TYPE_CHECKING, Tuple, Dict, List
+from typing import TYPE_CHECKING, Tuple, Dict, List, Iterable, Optional, Union
 
-import tldextract
 
 from django.utils import timezone
 
 from directory.models import ScanResult, DirectoryEntry
-from scanner.utils import HEADERS
-from scanner.assets import extract_assets, Asset
+from scanner.utils import HEADERS, extract_domain
+from scanner.assets import SCRIPT_SCAN_BUDGET, TimeBudget, extract_tag_assets, Asset
+from scanner.parsing import PageTags, collect_soup_tags, parse_page
 from scanner.http2 import check_http2
+from scanner.trackers import find_trackers
 
 
 if TYPE_CHECKING:
     from directory.models import DirectoryEntryQuerySet  # noqa: F401
 
 
-def perform_scan(url: str, permitted_domains: List[str]) -> ScanResult:
+#: ScanResult fields computed from the body of the landing page and its
+#: assets, rather than from response headers
+CONTENT_FIELDS = (
+    'safe_onion_address',
+    'no_analytics',
+    'no_cross_domain_assets',
+    'cross_domain_asset_summary',
+    'ignored_cross_domain_assets',
+    'body_truncated',
+    'script_scan_incomplete',
+    'analytics_trackers',
+)
+
+#: Largest landing page body that is read and parsed, in bytes. Larger
+#: bodies are cut off at this size.
+MAX_PAGE_BODY_SIZE = 5 * 1024 * 1024
+PAGE_CHUNK_SIZE = 64 * 1024
+
+#: Media types of landing pages whose body is read and parsed
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+
+def perform_scan(
+        url: str,
+        permitted_domains: List[str],
+        session: Optional[requests.Session] = None,
+        prior_result: Optional[ScanResult] = None,
+        max_body_size: Optional[int] = None,
+) -> ScanResult:
+    """
+    Scan a landing page. At most `max_body_size` bytes of it are read,
+    see `request_page`.
+    """
     scan_data = {
         'live': False,
         'landing_page_url': url,
     }
+    conditional_headers = get_conditional_headers(prior_result)
 
     try:
-        page, soup = request_and_scrape_page(url)
+        page = request_page(
+            url,
+            session=session,
+            headers=conditional_headers,
+            max_body_size=max_body_size,
+        )
 
     except requests.exceptions.RequestException:
         # Connection timed out, an invalid HTTP response was returned, or
@@ -39,16 +81,37 @@ def perform_scan(url: str, permitted_domains: List[str]) -> ScanResult:
 
     http_response_data = parse_page_data(page)
     scan_data.update(http_response_data)
+    scan_data.update(parse_validators(page, prior_result))
 
-    content_data = parse_soup_data(soup)
-    scan_data.update(content_data)
-
-    assets = extract_assets(soup, page.url)
-    asset_results = parse_assets(assets, [tldextract.extract(page.url).registered_domain] + permitted_domains)
-    scan_data.update(asset_results)
+    if conditional_headers and page.status_code == 304:
+        # Nothing to parse, the page is the same as on the prior scan
+        scan_data.update(parse_not_modified_page(page, prior_result))
+    else:
+        # Parse the page once for both the content checks and its assets
+        tags = parse_page(page.content, declared_encoding(page))
+        content_data = parse_content_data(tags)
+        scan_data.update(content_data)
+        scan_data['body_truncated'] = page.body_truncated
+
+        script_trackers = set()
+        budget = TimeBudget(SCRIPT_SCAN_BUDGET)
+        assets = extract_tag_assets(
+            tags,
+            page.url,
+            session=session,
+            cache=getattr(session, 'asset_cache', None),
+            trackers=script_trackers,
+            budget=budget,
+        )
+        scan_data['script_scan_incomplete'] = budget.ran_out
+        asset_results = parse_assets(assets, [extract_domain(page.url).registered_domain] + permitted_domains)
+        scan_data.update(asset_results)
+        scan_data.update(parse_trackers(page, script_trackers))
 
     if page.url:
-        http2_data = check_http2(page.url)
+        # A ScanSession remembers which hosts support HTTP/2 for the
+        # rest of the run, saving a TLS handshake per repeated host.
+        http2_data = check_http2(page.url, cache=getattr(session, 'http2_support', None))
     else:
         http2_data = {'http2': False}
     scan_data.update(http2_data)
@@ -56,18 +119,85 @@ def perform_scan(url: str, permitted_domains: List[str]) -> ScanResult:
     return ScanResult(**scan_data)
 
 
-def scan(entry: DirectoryEntry, commit=False) -> ScanResult:
+def scan_target(
+        target: Tuple[str, List[str], Optional[ScanResult]],
+        session: Optional[requests.Session] = None,
+        max_body_size: Optional[int] = None,
+) -> ScanResult:
+    """
+    Scan a `(url, permitted_domains, prior_result)` tuple with
+    `perform_scan`
+    """
+    url, permitted_domains, prior_result = target
+    return perform_scan(
+        url,
+        permitted_domains,
+        session=session,
+        prior_result=prior_result,
+        max_body_size=max_body_size,
+    )
+
+
+async def perform_scans_async(
+        targets: Iterable[Tuple[str, List[str], Optional[ScanResult]]],
+        concurrency: int = 100,
+        session: Optional[requests.Session] = None,
+        max_body_size: Optional[int] = None,
+) -> List[ScanResult]:
+    """
+    Scan several landing pages without blocking the running event loop,
+    keeping at most `concurrency` scans in flight. `targets` is an iterable
+    of `(url, permitted_domains, prior_result)` tuples, see `perform_scan`,
+    as is `max_body_size`; results are returned in the same order.
+
+    Each scan runs `perform_scan` on a thread of an executor of its own, so
+    the results are those of any other scan.
+    """
+    loop = asyncio.get_running_loop()
+    # Leave the loop's default executor alone
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    scan = functools.partial(scan_target, session=session, max_body_size=max_body_size)
+    try:
+        return await asyncio.gather(*(
+            loop.run_in_executor(executor, scan, target) for target in targets
+        ))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_permitted_domains(entry: DirectoryEntry) -> List[str]:
+    """
+    Registered domains that an entry is allowed to load assets from, in
+    addition to the domain of its landing page.
+    """
+    return [
+        extract_domain(d).registered_domain
+        for d in entry.permitted_domains_for_assets
+    ]
+
+
+def scan(
+        entry: DirectoryEntry,
+        commit=False,
+        session: Optional[requests.Session] = None,
+        max_body_size: Optional[int] = None,
+) -> ScanResult:
     """
     Scan a single site. This method accepts a DirectoryEntry instance which
     may or may not be saved to the database. You can optionally pass True for
     the commit argument, which will save the result to the database. In that
     case, the passed DirectoryEntry *must* already be in the database.
+
+    All HTTP requests are made through `session` if one is given, such as a
+    `scanner.session.ScanSession`. At most `max_body_size` bytes of the
+    landing page are read, see `request_page`.
     """
-    permitted_domains = [
-        tldextract.extract(d).registered_domain
-        for d in entry.permitted_domains_for_assets
-    ]
-    result = perform_scan(entry.landing_page_url, permitted_domains)
+    result = perform_scan(
+        entry.landing_page_url,
+        get_permitted_domains(entry),
+        session=session,
+        max_body_size=max_body_size,
+    )
 
     if commit:
         result.save()
@@ -75,71 +205,246 @@ def scan(entry: DirectoryEntry, commit=False) -> ScanResult:
     return result
 
 
-def bulk_scan(securedrops: 'DirectoryEntryQuerySet') -> None:
+def bulk_scan(
+        securedrops: 'DirectoryEntryQuerySet',
+        workers: int = 1,
+        use_asyncio: bool = False,
+        session: Optional[requests.Session] = None,
+        revalidate: bool = False,
+        max_body_size: Optional[int] = None,
+) -> None:
     """
     This method takes a queryset and scans the securedrop pages. Unlike the
     scan method that takes a single SecureDrop instance, this method requires
     a DirectoryEntryQueryset of SecureDrop instances that are in the database
     and always commits the results back to the database.
+
+    Up to `workers` landing pages are scanned at once by a thread pool,
+    which is driven from an asyncio event loop if `use_asyncio` is set, see
+    `perform_scans_async`. Either way each scan runs `perform_scan`. Comparing
+    against prior results and writing to the database happens afterwards on
+    the calling thread, in the same order as the queryset.
+
+    Pass a `scanner.session.ScanSession` as `session` to share pooled
+    keep-alive connections between all the requests of the run.
+
+    If `revalidate` is set, landing pages are requested conditionally using
+    the validators stored on each entry's latest result, and the content
+    checks of that result are reused for pages that have not been modified.
+    Entries published since their latest result are requested in full, see
+    `revalidated_result`.
+
+    At most `max_body_size` bytes of each landing page are read, defaulting
+    to MAX_PAGE_BODY_SIZE.
     """
 
     # Ensure that we have the domain annotation present
     securedrops = securedrops.with_domain_annotation()
+    entries = list(securedrops)
+
+    # Get the most recent scan of each entry before scanning, in one query
+    prior_results = {
+        result.securedrop_id: result
+        for result in ScanResult.objects.filter(
+            securedrop__in=[entry.pk for entry in entries],
+        ).select_related(
+            # Reused for landing pages that have not been modified
+            'asset_summary',
+            'ignored_asset_summary',
+        ).order_by('securedrop_id', '-result_last_seen').distinct('securedrop_id')
+    }
 
-    results_to_be_written = []
-    for entry in securedrops:
-        permitted_domains = [
-            tldextract.extract(d).registered_domain
-            for d in entry.permitted_domains_for_assets
-        ]
-        current_result = perform_scan(entry.landing_page_url, permitted_domains)
+    targets = [
+        (
+            entry.landing_page_url,
+            get_permitted_domains(entry),
+            revalidated_result(entry, prior_results.get(entry.pk)) if revalidate else None,
+        )
+        for entry in entries
+    ]
+
+    if use_asyncio:
+        scans = asyncio.run(perform_scans_async(
+            targets,
+            concurrency=workers,
+            session=session,
+            max_body_size=max_body_size,
+        ))
+    else:
+        scan = functools.partial(scan_target, session=session, max_body_size=max_body_size)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            scans = list(executor.map(scan, targets))
 
+    results_to_be_written = []
+    results_to_be_updated = []
+    live_results = []
+    now = timezone.now()
+    for entry, current_result in zip(entries, scans):
         # This is usually handled by Result.save, but since we're doing a
         # bulk save, we need to do it here
         current_result.securedrop = entry
 
-        # Before we save, let's get the most recent scan before saving
-        try:
-            prior_result = entry.results.latest()
-        except ScanResult.DoesNotExist:
-            results_to_be_written.append(current_result)
-            continue
-
-        if prior_result.is_equal_to(current_result):
+        prior_result = prior_results.get(entry.pk)
+        # The fingerprint of the prior result is stored with it
+        if prior_result is not None and prior_result.fingerprint == current_result.compute_fingerprint():
             # Then let's not waste a row in the database
-            prior_result.result_last_seen = timezone.now()
-            prior_result.save()
+            prior_result.result_last_seen = now
+            prior_result.etag = current_result.etag
+            prior_result.last_modified = current_result.last_modified
+            # Results bulk created before grades were computed for them
+            # were left ungraded
+            prior_result.compute_grade()
+            results_to_be_updated.append(prior_result)
+            current_result = prior_result
         else:
             # Then let's add this new scan result to the database
             results_to_be_written.append(current_result)
 
+        if current_result.live:
+            live_results.append((entry, current_result))
+
+    # The content of unchanged results is the same, so their entry doesn't
+    # need recomputing as ScanResult.save would do
+    ScanResult.objects.bulk_update(
+        results_to_be_updated,
+        ['result_last_seen', 'etag', 'last_modified', 'grade'],
+    )
+
     # Write new results to the db in a batch
-    return ScanResult.objects.bulk_create(results_to_be_written)
+    written = ScanResult.objects.bulk_create(results_to_be_written)
+
+    # Also handled by ScanResult.save, point entries at their new latest
+    # live result, which now has a primary key
+    entries_to_be_updated = []
+    for entry, result in live_results:
+        if entry.latest_live_result_id != result.pk:
+            entry.latest_live_result = result
+            entries_to_be_updated.append(entry)
+    DirectoryEntry.objects.bulk_update(entries_to_be_updated, ['latest_live_result'])
+
+    return written
+
+
+def request_and_scrape_page(
+        url: str,
+        allow_redirects: bool = True,
+        session: Optional[requests.Session] = None,
+        headers: Optional[Dict[str, str]] = None,
+        max_body_size: Optional[int] = None,
+) -> Tuple[requests.models.Response, BeautifulSoup]:
+    """Scrape and parse the HTML of a page into a BeautifulSoup. See
+    `request_page` for the arguments."""
+
+    page = request_page(
+        url,
+        allow_redirects=allow_redirects,
+        session=session,
+        headers=headers,
+        max_body_size=max_body_size,
+    )
+    soup = BeautifulSoup(page.content, "lxml", from_encoding=declared_encoding(page))
+
+    return page, soup
+
+
+def request_page(
+        url: str,
+        allow_redirects: bool = True,
+        session: Optional[requests.Session] = None,
+        headers: Optional[Dict[str, str]] = None,
+        max_body_size: Optional[int] = None,
+) -> requests.models.Response:
+    """Request a page. Any `headers` given are sent in addition to the
+    scanner's usual headers.
+
+    The page is downloaded in chunks and at most `max_body_size` bytes of it
+    are read, defaulting to MAX_PAGE_BODY_SIZE. Pages that are not HTML are
+    not read at all. Either way, `body_truncated` is set on the returned
+    response.
 
+    """
 
-def request_and_scrape_page(url: str, allow_redirects: bool = True) -> Tuple[requests.models.Response, BeautifulSoup]:
-    """Scrape and parse the HTML of a page into a BeautifulSoup"""
+    http = session or requests
+    request_headers = dict(HEADERS, **headers) if headers else HEADERS
 
     # Note: headers include User-Agent which is required for correct
     # scanning.
     try:
-        page = requests.get(
+        page = http.get(
             url,
             allow_redirects=allow_redirects,
-            headers=HEADERS,
+            headers=request_headers,
             timeout=10,
+            stream=True,
         )
-        soup = BeautifulSoup(page.content, "lxml")
     except requests.exceptions.MissingSchema:
-        page = requests.get(
+        page = http.get(
             'https://{}'.format(url),
             allow_redirects=allow_redirects,
-            headers=HEADERS,
+            headers=request_headers,
             timeout=10,
+            stream=True,
         )
-        soup = BeautifulSoup(page.content, "lxml")
 
-    return page, soup
+    if is_html(page):
+        page.body_truncated = read_page_body(page, max_body_size)
+    else:
+        page.body_truncated = discard_page_body(page)
+
+    return page
+
+
+def is_html(page: requests.models.Response) -> bool:
+    """Whether a page is HTML by its Content-Type, which is assumed when
+    the header is missing"""
+    content_type = page.headers.get('Content-Type', '')
+    media_type = content_type.split(';')[0].strip().lower()
+    return not media_type or media_type in HTML_CONTENT_TYPES
+
+
+def declared_encoding(page: requests.models.Response) -> Optional[str]:
+    """The character set given in the Content-Type header of a page, if
+    any.  Unlike `page.encoding`, this is not Latin-1 for text without
+    one, so that pages can declare their own."""
+    if 'charset' not in page.headers.get('Content-Type', '').lower():
+        return None
+    return requests.utils.get_encoding_from_headers(page.headers)
+
+
+def read_page_body(page: requests.models.Response, max_body_size: Optional[int] = None) -> bool:
+    """Read the body of a streamed response, stopping after `max_body_size`
+    bytes, and make it available as `page.content` as usual. Returns whether
+    the body was cut off.
+
+    """
+    if max_body_size is None:
+        max_body_size = MAX_PAGE_BODY_SIZE
+
+    body = bytearray()
+    truncated = False
+    for chunk in page.iter_content(chunk_size=PAGE_CHUNK_SIZE):
+        body.extend(chunk)
+        if len(body) > max_body_size:
+            truncated = True
+            break
+
+    page._content = bytes(body[:max_body_size])
+    page._content_consumed = True
+    if truncated:
+        # The rest of the body is still on the wire, so the connection
+        # can't be reused
+        page.close()
+    return truncated
+
+
+def discard_page_body(page: requests.models.Response) -> bool:
+    """Close a streamed response without reading its body, which is left
+    empty. Returns whether there was a body to discard."""
+    has_body = page.headers.get('Content-Length', '') != '0' and page.status_code != 304
+    page._content = b''
+    page._content_consumed = True
+    page.close()
+    return has_body
 
 
 def parse_page_data(page: requests.models.Response) -> Dict[str, bool]:
@@ -150,7 +455,6 @@ def parse_page_data(page: requests.models.Response) -> Dict[str, bool]:
         'no_cookies': validate_no_cookies(page),
         'no_cdn': validate_not_using_cdn(page),
         'expected_encoding': validate_encoding(page),
-        'no_analytics': validate_not_using_analytics(page),
         'no_server_info': validate_server_software(page),
         'no_server_version': validate_server_version(page),
         'csp_origin_only': validate_csp(page),
@@ -181,6 +485,75 @@ def parse_page_data(page: requests.models.Response) -> Dict[str, bool]:
     return http_response_data
 
 
+def revalidated_result(entry: DirectoryEntry, prior_result: Optional[ScanResult]) -> Optional[ScanResult]:
+    """
+    The prior result of an entry to request its landing page conditionally
+    with, or None to request it in full. Content checks carried over from a
+    result scanned before the entry was last published may be stale, since
+    publishing can change the domains its assets are permitted from.
+    """
+    if prior_result is None:
+        return None
+    if entry.last_published_at and entry.last_published_at > prior_result.result_last_seen:
+        return None
+    return prior_result
+
+
+def get_conditional_headers(prior_result: Optional[ScanResult]) -> Dict[str, str]:
+    """
+    Headers making a request for a landing page conditional on it having
+    changed since the given result was scanned
+    """
+    headers = {}
+    if prior_result is None or not prior_result.live:
+        return headers
+
+    if prior_result.etag:
+        headers['If-None-Match'] = prior_result.etag
+    if prior_result.last_modified:
+        headers['If-Modified-Since'] = prior_result.last_modified
+    return headers
+
+
+def parse_validators(page: requests.models.Response, prior_result: Optional[ScanResult]) -> Dict[str, str]:
+    """
+    Validators to send on the next scan of the page. A 304 response does not
+    have to repeat them, in which case those of the prior result still hold.
+    """
+    validators = {
+        'etag': page.headers.get('ETag', ''),
+        'last_modified': page.headers.get('Last-Modified', ''),
+    }
+    if page.status_code == 304 and prior_result is not None:
+        validators['etag'] = validators['etag'] or prior_result.etag
+        validators['last_modified'] = validators['last_modified'] or prior_result.last_modified
+    for field, value in validators.items():
+        # A validator that does not fit would fail the write of the whole
+        # batch of results, so the page is requested unconditionally instead
+        if len(value) > ScanResult._meta.get_field(field).max_length:
+            validators[field] = ''
+    return validators
+
+
+def parse_not_modified_page(page: requests.models.Response, prior_result: ScanResult) -> Dict[str, bool]:
+    """
+    Results for a landing page that answered a conditional request with 304
+    Not Modified. Checks of the page content are carried over from the prior
+    result, while header checks have already been run on the 304 response.
+    """
+    not_modified_data = {
+        field: getattr(prior_result, field)
+        for field in CONTENT_FIELDS
+    }
+    # The 304 stands in for the 200 response of the prior scan
+    not_modified_data['http_status_200_ok'] = prior_result.http_status_200_ok
+    if 'Content-Type' not in page.headers:
+        # The encoding comes from the Content-Type of the page itself,
+        # which a 304 response need not repeat
+        not_modified_data['expected_encoding'] = prior_result.expected_encoding
+    return not_modified_data
+
+
 def parse_assets(assets, permitted_domains: List[str]) -> Dict[str, bool]:
     summary = ''
     ignored_summary = ''
@@ -191,7 +564,7 @@ def parse_assets(assets, permitted_domains: List[str]) -> Dict[str, bool]:
 
     for asset in assets:
         # ignore subdomain attribute
-        extracted = tldextract.extract(asset.resource)
+        extracted = extract_domain(asset.resource)
         (_, asset_domain, asset_suffix) = extracted
         if not (asset_domain and asset_suffix):
             # we've extracted something that probably is not a real domain
@@ -238,14 +611,20 @@ def summarize_assets(assets: List[Asset]) -> str:
 
 
 def parse_soup_data(soup: BeautifulSoup) -> Dict[str, bool]:
+    return parse_content_data(collect_soup_tags(soup))
+
+
+def parse_content_data(tags: PageTags) -> Dict[str, bool]:
+    """Checks of the content of a page, given its tags as collected by one
+    of the backends in `scanner.parsing`"""
     return {
-        'safe_onion_address': validate_onion_address_not_in_href(soup),
+        'safe_onion_address': validate_onion_links(tags['a']),
     }
 
 
 def same_domain(url1: str, url2: str) -> bool:
-    parsed_url1 = tldextract.extract(url1)
-    parsed_url2 = tldextract.extract(url2)
+    parsed_url1 = extract_domain(url1)
+    parsed_url2 = extract_domain(url2)
 
     return (parsed_url1.domain == parsed_url2.domain and
             parsed_url1.suffix == parsed_url2.suffix)
@@ -253,7 +632,7 @@ def same_domain(url1: str, url2: str) -> bool:
 
 def validate_subdomain(url):
     """Is the landing page on a subdomain"""
-    parsed_domain = tldextract.extract(url)
+    parsed_domain = extract_domain(url)
     return parsed_domain.subdomain not in ('', 'www')
 
 
@@ -266,30 +645,19 @@ def validate_not_using_cdn(page):
 
 
 def validate_not_using_analytics(page):
-    """Scan for common analytics scripts anywhere in the page
-
-    Google Analytics: https://support.google.com/analytics/answer/1032399?hl=en
+    """Scan for the scripts of common analytics services anywhere in the
+    page. See `scanner.trackers` for the services looked for."""
+    return not find_trackers(page.content)
 
-    Chartbeat: http://support.chartbeat.com/docs/
 
-    Quantcast: https://quantcast.zendesk.com/hc/en-us/articles/115014888548--Implement-Quantcast-Tag-Directly-on-Your-Site
-
-    comScore: http://www.scorecardresearch.com/ (no public docs)
-
-    Krux Digital: https://whotracks.me/trackers/krux_digital.html#News%20and%20Portals
-    """
-    # Common scripts: Google Analytics, Quantcast, Chartbeat (two variants),
-    # comScore
-    analytics_scripts = ('ga.js', 'analytics.js', 'quant.js',
-                         'chartbeat.js', 'chartbeat_mab.js', 'beacon.js',
-                         'krxd.net')
-    page_str = str(page.content)
-    for script in analytics_scripts:
-        if script in page_str:
-            return False
-
-    # No recognized script in page body
-    return True
+def parse_trackers(page: requests.models.Response, script_trackers: Iterable[str]) -> Dict[str, Union[bool, str]]:
+    """Analytics services found in the body of a page or in the bodies of
+    its external scripts, given as `script_trackers`"""
+    trackers = find_trackers(page.content) | set(script_trackers)
+    return {
+        'no_analytics': not trackers,
+        'analytics_trackers': ', '.join(sorted(trackers)),
+    }
 
 
 def validate_security_header(page, header, expected_value):
@@ -454,7 +822,10 @@ def validate_no_cookies(page):
 
 
 def validate_onion_address_not_in_href(page):
-    links_on_landing_page = page.find_all("a")
+    return validate_onion_links(page.find_all("a"))
+
+
+def validate_onion_links(links_on_landing_page):
     for link in links_on_landing_page:
         try:
             if '.onion' in link.attrs['href']:
@@ -0,0 +1,92 @@
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from django.utils import timezone
+
+from directory.models import DirectoryEntry
+from scanner.scanner import bulk_scan
+
+
+#: How long a scan result stays fresh, by grade. Entries that are down or
+#: failing are checked often so that fixes and outages show up quickly,
+#: while entries that passed every check are checked least.
+SCAN_INTERVALS = {
+    '?': timedelta(hours=4),
+    'F': timedelta(hours=4),
+    'D': timedelta(hours=12),
+    'C': timedelta(hours=24),
+    'B': timedelta(hours=24),
+    'A': timedelta(hours=72),
+}
+DEFAULT_SCAN_INTERVAL = timedelta(hours=24)
+
+#: Number of entries handed to bulk_scan at a time by scheduled_scan
+SCHEDULED_BATCH_SIZE = 10
+
+
+def scan_interval(entry: DirectoryEntry) -> timedelta:
+    """
+    How long after its latest scan an entry is due to be scanned again. The
+    entry must carry the annotations added by
+    `DirectoryEntryQuerySet.with_latest_result_annotation`.
+    """
+    if entry.latest_result_last_seen is None:
+        return timedelta(0)
+    if entry.last_published_at and entry.last_published_at > entry.latest_result_last_seen:
+        # Edited since it was last scanned
+        return timedelta(0)
+    return SCAN_INTERVALS.get(entry.latest_result_grade, DEFAULT_SCAN_INTERVAL)
+
+
+def scan_priority(entry: DirectoryEntry, now: datetime) -> float:
+    """
+    How overdue an entry is for a scan, as the age of its latest result
+    divided by its scan interval. Entries are due once this reaches 1.
+    """
+    interval = scan_interval(entry)
+    if not interval:
+        return float('inf')
+    return (now - entry.latest_result_last_seen) / interval
+
+
+def due_entries(now: Optional[datetime] = None) -> List[DirectoryEntry]:
+    """
+    Listed, published entries that are due to be scanned, most overdue first
+    """
+    now = now or timezone.now()
+    entries = DirectoryEntry.objects.live().listed().with_latest_result_annotation()
+    prioritized = [(scan_priority(entry, now), entry) for entry in entries]
+    return [
+        entry for priority, entry in sorted(prioritized, key=lambda p: p[0], reverse=True)
+        if priority >= 1
+    ]
+
+
+def scheduled_scan(
+        time_budget: Optional[float] = None,
+        batch_size: int = SCHEDULED_BATCH_SIZE,
+        **kwargs,
+) -> List[DirectoryEntry]:
+    """
+    Scan the entries that are due, most overdue first, in batches of
+    `batch_size`. No new batch is started once `time_budget` seconds have
+    passed, so entries left over are picked up by the next run. Other
+    keyword arguments are passed on to `bulk_scan`. Returns the entries
+    that were scanned.
+    """
+    started = time.monotonic()
+    batch_size = max(batch_size, kwargs.get('workers', 1))
+    entries = due_entries()
+
+    scanned = []
+    for start in range(0, len(entries), batch_size):
+        if time_budget is not None and time.monotonic() - started >= time_budget:
+            break
+        batch = entries[start:start + batch_size]
+        bulk_scan(
+            DirectoryEntry.objects.filter(pk__in=[entry.pk for entry in batch]),
+            **kwargs,
+        )
+        scanned.extend(batch)
+    return scanned
@@ -0,0 +1,102 @@
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scanner.assets import AssetCache
+
+
+# Number of hosts to keep a connection pool for, and the number of idle
+# keep-alive connections kept open to each of those hosts.
+POOL_HOSTS = 100
+POOL_CONNECTIONS_PER_HOST = 4
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that keeps track of how many connections it has opened,
+    including those in pools that have since been evicted.
+
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.retired_connections = 0
+        pools = self.poolmanager.pools
+        dispose_pool = pools.dispose_func
+
+        def retire_pool(pool):
+            self.retired_connections += pool.num_connections
+            if dispose_pool is not None:
+                dispose_pool(pool)
+        pools.dispose_func = retire_pool
+
+    @property
+    def connections_opened(self) -> int:
+        pools = self.poolmanager.pools
+        live_connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                live_connections += pool.num_connections
+        return self.retired_connections + live_connections
+
+
+class ScanSession(requests.Session):
+    """A requests session shared by all the requests made during a scan run.
+
+    Connections are kept alive and pooled per host, so landing pages that
+    load several assets from their own server only pay for one TLS
+    handshake. It also carries caches that only make sense for one run,
+    see `http2_support` and `asset_cache`. Safe to share between the
+    threads of a bulk scan.
+
+    Unlike a plain session, it never stores cookies, so every page is
+    requested as if by a first-time visitor and the cookies it sets are
+    seen by `validate_no_cookies`.
+
+    """
+
+    def __init__(
+            self,
+            pool_hosts: int = POOL_HOSTS,
+            pool_connections_per_host: int = POOL_CONNECTIONS_PER_HOST,
+    ) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self.request_count = 0
+        # Store no cookies from any domain
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        # Result of the HTTP/2 ALPN check for each host seen in this run
+        self.http2_support = {}
+        # URLs found in the external scripts and stylesheets seen in this run
+        self.asset_cache = AssetCache()
+        self.adapters.clear()
+        for prefix in ('https://', 'http://'):
+            self.mount(prefix, CountingHTTPAdapter(
+                pool_connections=pool_hosts,
+                pool_maxsize=pool_connections_per_host,
+            ))
+
+    def send(self, *args, **kwargs):
+        # Called once per request, including each redirect that is followed
+        with self._lock:
+            self.request_count += 1
+        return super().send(*args, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        """Number of requests sent, connections opened, and requests that
+        were sent over an already open connection
+
+        """
+        connections = sum(
+            adapter.connections_opened
+            for adapter in self.adapters.values()
+            if isinstance(adapter, CountingHTTPAdapter)
+        )
+        return {
+            'requests': self.request_count,
+            'connections': connections,
+            'reused_connections': max(self.request_count - connections, 0),
+        }
@@ -1,14 +1,20 @@
+import time
 from unittest import TestCase, mock
 
 from bs4 import BeautifulSoup
 
 from scanner.assets import (
     Asset,
+    AssetCache,
+    LinkedAsset,
+    TimeBudget,
     extract_assets,
     fetch_asset,
+    fetch_assets,
     parse_srcset,
     urls_from_css,
     urls_from_css_declarations,
+    urls_from_script,
 )
 
 
@@ -298,6 +304,20 @@ class AssetExtractionTestCase(TestCase):
             extract_assets(soup, self.test_url),
         )
 
+    @mock.patch('scanner.assets.requests.get')
+    def test_should_not_report_trackers_merely_named_in_scripts(self, requests_get):
+        requests_get.return_value = mock.Mock(
+            text="/* Loads nothing like ga.js or analytics.js */ var beacon = 'beacon.js';"
+        )
+        html = """
+        <html><head><script src="/static/bundle.js"></script></head><body></body></html>
+        """
+        trackers = set()
+
+        extract_assets(BeautifulSoup(html, "lxml"), 'http://example.com', trackers=trackers)
+
+        self.assertEqual(trackers, set())
+
 
 class TestAssetFetching(TestCase):
     @mock.patch('scanner.assets.requests.get')
@@ -312,6 +332,170 @@ class TestAssetFetching(TestCase):
             timeout=5,
         )
 
+    def test_should_fetch_assets_with_session(self):
+        session = mock.Mock()
+        fetch_asset('example.gif', 'http://example.com', session=session)
+
+        session.get.assert_called_once_with(
+            'http://example.com/example.gif',
+            headers={'User-Agent': 'SecureDrop Landing Page Scanner 0.1.0'},
+            timeout=5,
+        )
+
+    @mock.patch('scanner.assets.requests.get')
+    def test_should_fetch_each_asset_once(self, requests_get):
+        requests_get.side_effect = lambda url, **kwargs: mock.Mock(text=url)
+
+        fetched = fetch_assets(['a.js', 'b.css', 'a.js'], 'http://example.com')
+
+        self.assertEqual(fetched, {
+            'a.js': 'http://example.com/a.js',
+            'b.css': 'http://example.com/b.css',
+        })
+        self.assertEqual(requests_get.call_count, 2)
+
+    @mock.patch('scanner.assets.requests.get')
+    def test_should_skip_assets_not_fetched_before_deadline(self, requests_get):
+        def slow_get(url, **kwargs):
+            if url.endswith('slow.js'):
+                time.sleep(0.5)
+            return mock.Mock(text="var url = 'http://example.org/';")
+        requests_get.side_effect = slow_get
+
+        fetched = fetch_assets(['slow.js', 'fast.js'], 'http://example.com', deadline=0.1)
+
+        self.assertIsNone(fetched['slow.js'])
+        self.assertIsNotNone(fetched['fast.js'])
+
+    @mock.patch('scanner.assets.requests.get')
+    def test_should_keep_document_order_of_fetched_assets(self, requests_get):
+        def get(url, **kwargs):
+            # Make the first script finish last
+            if url.endswith('first.js'):
+                time.sleep(0.1)
+            return mock.Mock(text="var url = '{}';".format(url.replace('.js', '.org')))
+        requests_get.side_effect = get
+
+        html = """
+        <html><head><script src="first.js"></script><script src="second.js"></script></head><body></body></html>
+        """
+        soup = BeautifulSoup(html, "lxml")
+        self.assertEqual(
+            [
+                Asset(resource='first.js', kind='script-src', initiator='http://example.com'),
+                Asset(resource='http://example.com/first.org', kind='script-resource', initiator='first.js'),
+                Asset(resource='second.js', kind='script-src', initiator='http://example.com'),
+                Asset(resource='http://example.com/second.org', kind='script-resource', initiator='second.js'),
+            ],
+            extract_assets(soup, 'http://example.com'),
+        )
+
+
+class TestAssetCache(TestCase):
+    def test_should_count_hits_and_misses(self):
+        cache = AssetCache()
+        linked_asset = LinkedAsset(urls=['http://example.org/'], trackers=frozenset())
+        self.assertIsNone(cache.get('script', 'http://example.com/a.js'))
+        cache.set('script', 'http://example.com/a.js', linked_asset)
+
+        self.assertEqual(cache.get('script', 'HTTP://EXAMPLE.COM/a.js#top'), linked_asset)
+        self.assertIsNone(cache.get('style', 'http://example.com/a.js'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'size': 1})
+
+    def test_should_evict_least_recently_used_assets(self):
+        cache = AssetCache(maxsize=2)
+        empty = LinkedAsset(urls=[], trackers=frozenset())
+        cache.set('script', 'http://example.com/a.js', empty)
+        cache.set('script', 'http://example.com/b.js', empty)
+        cache.get('script', 'http://example.com/a.js')
+        cache.set('script', 'http://example.com/c.js', empty)
+
+        self.assertIsNone(cache.get('script', 'http://example.com/b.js'))
+        self.assertEqual(cache.get('script', 'http://example.com/a.js'), empty)
+        self.assertEqual(cache.get('script', 'http://example.com/c.js'), empty)
+
+    @mock.patch('scanner.assets.requests.get')
+    def test_should_not_refetch_cached_assets(self, requests_get):
+        requests_get.return_value = mock.Mock(
+            text="var url = 'http://example.org/';"
+        )
+        html = """
+        <html><head><script src="https://cdn.example.net/lib.js"></script></head><body></body></html>
+        """
+        cache = AssetCache()
+
+        first = extract_assets(BeautifulSoup(html, "lxml"), 'http://example.com', cache=cache)
+        second = extract_assets(BeautifulSoup(html, "lxml"), 'http://example.com', cache=cache)
+
+        self.assertEqual(first, second)
+        self.assertIn(
+            Asset(resource='http://example.org/', kind='script-resource', initiator='https://cdn.example.net/lib.js'),
+            second,
+        )
+        requests_get.assert_called_once()
+
+    @mock.patch('scanner.assets.requests.get')
+    def test_should_report_trackers_of_cached_assets(self, requests_get):
+        requests_get.return_value = mock.Mock(
+            text="s.src = 'https://static.chartbeat.com/js/chartbeat.js';"
+        )
+        html = """
+        <html><head><script src="https://cdn.example.net/lib.js"></script></head><body></body></html>
+        """
+        cache = AssetCache()
+        first_trackers = set()
+        second_trackers = set()
+
+        extract_assets(BeautifulSoup(html, "lxml"), 'http://example.com', cache=cache, trackers=first_trackers)
+        extract_assets(BeautifulSoup(html, "lxml"), 'http://example.com', cache=cache, trackers=second_trackers)
+
+        self.assertEqual(first_trackers, {'Chartbeat'})
+        self.assertEqual(second_trackers, {'Chartbeat'})
+
+
+class TestScriptUrlExtraction(TestCase):
+    def test_should_extract_urls_from_string_literals(self):
+        self.assertCountEqual(
+            urls_from_script("var a = 'https://example.org/a.js', b = \"example.net\";"),
+            ['https://example.org/a.js', 'example.net'],
+        )
+
+    @mock.patch('scanner.assets.SCRIPT_SCAN_LIMIT', 40)
+    def test_should_only_search_the_start_of_large_scripts(self):
+        js = "var a = 'https://example.org/';" + ' ' * 40 + "var b = 'https://example.net/';"
+
+        self.assertEqual(urls_from_script(js), ['https://example.org/'])
+
+    def test_should_stop_searching_once_the_budget_is_exhausted(self):
+        js = "var a = 'https://example.org/', b = 'https://example.net/';"
+        budget = TimeBudget(30)
+
+        with mock.patch('scanner.assets.time.monotonic', side_effect=[0, 60]):
+            urls = urls_from_script(js, budget=budget)
+
+        self.assertEqual(len(urls), 1)
+        self.assertIs(budget.ran_out, True)
+
+    def test_should_not_mark_budget_run_out_if_search_finished(self):
+        budget = TimeBudget(30)
+
+        with mock.patch('scanner.assets.time.monotonic', side_effect=[0, 10]):
+            urls_from_script("var a = 'https://example.org/';", budget=budget)
+
+        self.assertIs(budget.ran_out, False)
+
+    @mock.patch('scanner.assets.requests.get')
+    def test_should_not_cache_assets_searched_after_the_budget(self, requests_get):
+        requests_get.return_value = mock.Mock(text="var url = 'http://example.org/';")
+        html = """
+        <html><head><script src="https://cdn.example.net/lib.js"></script></head><body></body></html>
+        """
+        cache = AssetCache()
+
+        extract_assets(BeautifulSoup(html, "lxml"), 'http://example.com', cache=cache, script_scan_budget=0)
+
+        self.assertIsNone(cache.get('script', 'https://cdn.example.net/lib.js'))
+
 
 class TestCssUrlExtractionFromDeclarations(TestCase):
     def test_should_extract_urls_from_css_declarations(self):
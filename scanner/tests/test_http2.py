@@ -0,0 +1,28 @@
+import socket
+from unittest import TestCase, mock
+
+from scanner.http2 import check_http2
+
+
+class CheckHttp2TestCase(TestCase):
+    @mock.patch('scanner.http2.socket.create_connection', side_effect=OSError)
+    def test_should_not_change_default_socket_timeout(self, create_connection):
+        default_timeout = socket.getdefaulttimeout()
+
+        self.assertEqual(check_http2('https://example.com'), {'http2': False})
+        self.assertEqual(socket.getdefaulttimeout(), default_timeout)
+        create_connection.assert_called_once_with(('example.com', 443), timeout=5)
+
+    @mock.patch('scanner.http2.socket.create_connection', side_effect=OSError)
+    def test_should_store_result_in_cache(self, create_connection):
+        cache = {}
+        check_http2('https://example.com/tips', cache=cache)
+
+        self.assertEqual(cache, {'example.com': False})
+
+    @mock.patch('scanner.http2.socket.create_connection')
+    def test_should_not_connect_if_host_is_cached(self, create_connection):
+        cache = {'example.com': True}
+
+        self.assertEqual(check_http2('https://example.com/tips', cache=cache), {'http2': True})
+        create_connection.assert_not_called()
@@ -0,0 +1,102 @@
+from unittest import TestCase
+
+from bs4 import BeautifulSoup
+
+from scanner.benchmarks import find_all_tags, fixture_pages
+from scanner.parsing import (
+    PageTag,
+    collect_soup_tags,
+    parse_lxml_tags,
+    parse_soup_tags,
+)
+
+
+# Attributes read by the scanner. The backends differ on others that it
+# doesn't read, such as the whitespace in class lists.
+SCANNED_ATTRIBUTES = ('href', 'poster', 'rel', 'src', 'srcset', 'style')
+
+
+def scanned_parts(tags):
+    return {
+        name: [
+            (tag.name, {attr: tag.attrs.get(attr) for attr in SCANNED_ATTRIBUTES}, tag.text)
+            for tag in group
+        ]
+        for name, group in tags.items()
+    }
+
+
+class ParserBackendTestCase(TestCase):
+    html = b"""
+    <html><head>
+      <link rel="stylesheet" href="a.css"><link rel="icon" href="a.ico">
+      <style>p { background: url(bg.png) }</style>
+      <script>var x = "https://example.com/x.js";</script>
+    </head><body>
+      <!-- <a href="commented.onion"></a> -->
+      <a href="1"><img src="1.png" style="color: red"></a><a href="2"></a>
+    </body></html>
+    """
+
+    def test_should_collect_tags_by_kind_in_document_order(self):
+        for parse in (parse_lxml_tags, parse_soup_tags):
+            with self.subTest(parse=parse.__name__):
+                tags = parse(self.html)
+
+                self.assertEqual([a.attrs['href'] for a in tags['a']], ['1', '2'])
+                self.assertEqual([link.attrs['href'] for link in tags['stylesheet']], ['a.css'])
+                self.assertEqual([tag.name for tag in tags['inline-style']], ['img'])
+                self.assertEqual([tag.text for tag in tags['style']], ['p { background: url(bg.png) }'])
+                self.assertEqual([tag.text for tag in tags['script']], ['var x = "https://example.com/x.js";'])
+                self.assertEqual(tags['img'], [PageTag(name='img', attrs={'src': '1.png', 'style': 'color: red'}, text='')])
+
+    def test_should_fall_back_to_beautifulsoup_for_documents_lxml_rejects(self):
+        self.assertEqual(parse_lxml_tags(b''), parse_soup_tags(b''))
+
+    def test_should_decode_page_with_given_encoding(self):
+        html = '<html><body><img src="/café.png"></body></html>'.encode('utf-8')
+
+        for parse in (parse_lxml_tags, parse_soup_tags):
+            with self.subTest(parse=parse.__name__):
+                tags = parse(html, 'utf-8')
+
+                self.assertEqual(tags['img'][0].attrs['src'], '/café.png')
+
+    def test_given_encoding_should_take_precedence_over_page(self):
+        html = (
+            '<html><head><meta charset="utf-8"></head>'
+            '<body><img src="/café.png"></body></html>'
+        ).encode('iso-8859-1')
+
+        for parse in (parse_lxml_tags, parse_soup_tags):
+            with self.subTest(parse=parse.__name__):
+                tags = parse(html, 'iso-8859-1')
+
+                self.assertEqual(tags['img'][0].attrs['src'], '/café.png')
+
+    def test_backends_should_agree_on_pages_without_declared_encoding(self):
+        html = (
+            '<html><body><img src="/café.png">'
+            '<script>var x = "https://example.com/naïve.js";</script>'
+            '</body></html>'
+        ).encode('utf-8')
+
+        self.assertEqual(
+            scanned_parts(parse_lxml_tags(html)),
+            scanned_parts(parse_soup_tags(html)),
+        )
+        self.assertEqual(parse_lxml_tags(html)['img'][0].attrs['src'], '/café.png')
+
+    def test_backends_should_agree_on_fixtures(self):
+        for url, body in fixture_pages():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    scanned_parts(parse_lxml_tags(body)),
+                    scanned_parts(parse_soup_tags(body)),
+                )
+
+    def test_walk_should_match_searching_for_each_kind_of_tag_on_fixtures(self):
+        for url, body in fixture_pages():
+            with self.subTest(url=url):
+                soup = BeautifulSoup(body, "lxml")
+                self.assertEqual(collect_soup_tags(soup), find_all_tags(soup))
@@ -1,19 +1,24 @@
+import asyncio
+import io
 import os
 import re
+import threading
 from unittest import mock
 from datetime import datetime
 
 from django.test import TestCase
 from django.utils.timezone import utc
+import requests
 import vcr
 
 from scanner import scanner
 from scanner.assets import Asset
 from scanner.tests.utils import (
     NON_EXISTENT_URL,
+    CassetteAdapter,
     requests_get_mock,
 )
-from directory.models import DirectoryEntry
+from directory.models import DirectoryEntry, ScanResult
 from directory.tests.factories import DirectoryEntryFactory
 
 
@@ -31,7 +36,22 @@ def long_lasting_cookies(response):
 
 mod_vcr = vcr.VCR(before_record_response=long_lasting_cookies)
 
+# vcrpy's connection stubs are not thread-safe, so tests that play back
+# cassettes fetch a page's assets one at a time.
+serial_asset_fetches = mock.patch('scanner.assets.ASSET_FETCH_CONCURRENCY', 1)
 
+
+def html_response(body, content_type='text/html; charset=utf-8'):
+    """An unread, streamed response with the given body"""
+    page = requests.models.Response()
+    page.status_code = 200
+    page.url = NON_EXISTENT_URL
+    page.headers['Content-Type'] = content_type
+    page.raw = io.BytesIO(body)
+    return page
+
+
+@serial_asset_fetches
 class ScannerTest(TestCase):
     """
     Tests the landing page scanner. These tests make use of vcrpy, which
@@ -153,6 +173,7 @@ class ScannerTest(TestCase):
         )
         result = scanner.scan(ap_site)
         self.assertFalse(result.no_analytics)
+        self.assertIn('Google Analytics', result.analytics_trackers)
 
     @mod_vcr.use_cassette(os.path.join(VCR_DIR, 'scan-site-with-trackers.yaml'))
     def test_scan_detects_presence_of_cross_domain_assets(self):
@@ -210,6 +231,7 @@ class ScannerTest(TestCase):
         )
         result = scanner.scan(fpf_site)
         self.assertTrue(result.no_analytics)
+        self.assertEqual(result.analytics_trackers, '')
 
     @mod_vcr.use_cassette(os.path.join(VCR_DIR, 'scrape-securedrop-dot-org.yaml'))
     def test_request_gets_page_if_protocol_identifier_present(self):
@@ -308,6 +330,112 @@ class ScannerTest(TestCase):
                 1, page.results.count()
             )
 
+    def assert_bulk_scan_matches_serial_scan(self, **kwargs):
+        """
+        Scan two entries with scanner.bulk_scan and the given arguments,
+        playing back the bulk-scan cassette, and check that it saves the
+        same results as scanning each entry on its own
+        """
+        DirectoryEntryFactory.create(
+            title='SecureDrop',
+            landing_page_url='https://securedrop.org',
+            onion_address='notreal.onion'
+        )
+        DirectoryEntryFactory.create(
+            title='Freedom of the Press Foundation',
+            landing_page_url='https://freedom.press',
+            onion_address='notreal-2.onion'
+        )
+        # vcrpy can't serve concurrent scans, so the cassette is played
+        # back through a transport adapter
+        session = requests.Session()
+        session.mount('https://', CassetteAdapter(os.path.join(VCR_DIR, 'bulk-scan.yaml')))
+
+        with mock.patch('scanner.scanner.check_http2', return_value={'http2': False}):
+            scanner.bulk_scan(DirectoryEntry.objects.all(), session=session, **kwargs)
+
+            for page in DirectoryEntry.objects.all():
+                result = page.results.get()
+                self.assertIs(result.live, True)
+                self.assertTrue(result.is_equal_to(
+                    scanner.perform_scan(page.landing_page_url, [], session=session)
+                ))
+
+    @mock.patch('scanner.assets.ASSET_FETCH_CONCURRENCY', 4)
+    def test_bulk_scan_with_workers(self):
+        """
+        When scanner.bulk_scan is called with several workers, it should
+        save the same results as a serial scan
+        """
+        self.assert_bulk_scan_matches_serial_scan(workers=2)
+
+    @mock.patch('scanner.assets.ASSET_FETCH_CONCURRENCY', 4)
+    def test_bulk_scan_with_asyncio(self):
+        """
+        When scanner.bulk_scan is called with use_asyncio, it should save
+        the same results as a serial scan
+        """
+        self.assert_bulk_scan_matches_serial_scan(workers=2, use_asyncio=True)
+
+    def test_bulk_scan_passes_max_body_size_on(self):
+        """
+        When scanner.bulk_scan is given a max_body_size, every scan should
+        read at most that much of its landing page
+        """
+        DirectoryEntryFactory.create(landing_page_url='https://securedrop.org')
+        perform_scan = mock.Mock(return_value=ScanResult(live=True, landing_page_url='https://securedrop.org'))
+
+        with mock.patch('scanner.scanner.perform_scan', new=perform_scan):
+            scanner.bulk_scan(DirectoryEntry.objects.all(), max_body_size=100)
+
+        self.assertEqual(perform_scan.call_args.kwargs['max_body_size'], 100)
+
+    @mock.patch(
+        'scanner.scanner.perform_scan',
+        new=lambda url, permitted_domains, session=None, prior_result=None, max_body_size=None: ScanResult(live=True, landing_page_url=url),
+    )
+    def test_bulk_scan_query_count_does_not_depend_on_entries(self):
+        """
+        When scanner.bulk_scan is called, it should look up prior results,
+        update unchanged ones, insert new ones and point entries at their
+        latest live results in one query each
+        """
+        unchanged = DirectoryEntryFactory.create(landing_page_url='https://securedrop.org')
+        changed = DirectoryEntryFactory.create(landing_page_url='https://freedom.press')
+        DirectoryEntryFactory.create(landing_page_url='https://example.org')
+        ScanResult(live=True, landing_page_url=unchanged.landing_page_url).save()
+        ScanResult(live=False, landing_page_url=changed.landing_page_url).save()
+        unchanged_result = unchanged.results.get()
+
+        # Entries, prior results, the update, the insert and the entries
+        with self.assertNumQueries(5):
+            scanner.bulk_scan(DirectoryEntry.objects.all())
+
+        self.assertEqual(unchanged.results.get().pk, unchanged_result.pk)
+        changed.refresh_from_db()
+        self.assertEqual(changed.get_live_result(), changed.results.latest())
+        self.assertGreater(
+            unchanged.results.get().result_last_seen,
+            unchanged_result.result_last_seen,
+        )
+        self.assertEqual(changed.results.count(), 2)
+        self.assertEqual(changed.results.latest().live, True)
+
+    @mod_vcr.use_cassette(
+        os.path.join(VCR_DIR, 'full-scan-site-live.yaml'),
+        allow_playback_repeats=True,
+    )
+    def test_async_scan_matches_scan(self):
+        """
+        perform_scans_async should produce the same result as perform_scan
+        """
+        url = 'https://securedrop.org'
+        result = scanner.perform_scan(url, [])
+        async_result, = asyncio.run(scanner.perform_scans_async([(url, [], None)], concurrency=1))
+
+        self.assertTrue(async_result.live)
+        self.assertTrue(result.is_equal_to(async_result))
+
     @mock.patch(
         'scanner.scanner.requests.get',
         new=requests_get_mock
@@ -368,7 +496,7 @@ class ScannerTest(TestCase):
 
     @mock.patch('scanner.scanner.requests.get')
     def test_should_call_requests_with_correct_arguments(self, requests_get):
-        requests_get.return_value = mock.Mock(content='')
+        requests_get.return_value = html_response(b'')
         scanner.request_and_scrape_page(NON_EXISTENT_URL)
         requests_get.assert_called_once_with(
             NON_EXISTENT_URL,
@@ -377,9 +505,25 @@ class ScannerTest(TestCase):
                 'User-Agent': 'SecureDrop Landing Page Scanner 0.1.0',
             },
             timeout=10,
+            stream=True,
+        )
+
+    def test_should_make_requests_with_session(self):
+        session = mock.Mock()
+        session.get.return_value = html_response(b'')
+        scanner.request_and_scrape_page(NON_EXISTENT_URL, session=session)
+        session.get.assert_called_once_with(
+            NON_EXISTENT_URL,
+            allow_redirects=True,
+            headers={
+                'User-Agent': 'SecureDrop Landing Page Scanner 0.1.0',
+            },
+            timeout=10,
+            stream=True,
         )
 
 
+@serial_asset_fetches
 class ScannerRedirectionSuccess(TestCase):
     @mod_vcr.use_cassette(os.path.join(VCR_DIR, 'scan-with-good-redirection.yaml'))
     def test_redirect_target_saved(self):
@@ -427,6 +571,7 @@ class ScannerRedirectionSuccess(TestCase):
         self.assertFalse(result.http_status_200_ok)
 
 
+@serial_asset_fetches
 class ScannerSubdomainRedirect(TestCase):
     @mod_vcr.use_cassette(os.path.join(VCR_DIR, 'scan-with-subdomain-redirection.yaml'))
     def test_redirect_from_subdomain(self):
@@ -440,6 +585,7 @@ class ScannerSubdomainRedirect(TestCase):
         self.assertTrue(r.no_cross_domain_redirects)
 
 
+@serial_asset_fetches
 class ScannerCrossDomainRedirect(TestCase):
     @mod_vcr.use_cassette(os.path.join(VCR_DIR, 'scan-with-cross-domain-redirection.yaml'))
     def test_cross_domain_redirect_detected_and_saved(self):
@@ -496,3 +642,233 @@ class AssetParsingTest(TestCase):
                 'cross_domain_asset_summary': """z.com\n  * (img-src) http://a.com/a.gif\n"""
             }
         )
+
+
+class AsyncScanTest(TestCase):
+    def setUp(self):
+        self.urls = ['https://securedrop.org', 'https://freedom.press']
+
+    def test_should_not_replace_default_executor_of_loop(self):
+        async def scan():
+            loop = asyncio.get_running_loop()
+            with mock.patch.object(loop, 'set_default_executor') as set_default_executor, \
+                    mock.patch('scanner.scanner.perform_scan', return_value=ScanResult(live=True)):
+                await scanner.perform_scans_async([(url, [], None) for url in self.urls], concurrency=2)
+            set_default_executor.assert_not_called()
+
+        asyncio.run(scan())
+
+    def test_should_scan_off_the_loop_in_order_of_targets(self):
+        scan_threads = []
+
+        def perform_scan(url, permitted_domains, **kwargs):
+            scan_threads.append(threading.current_thread())
+            return ScanResult(live=True, landing_page_url=url)
+
+        with mock.patch('scanner.scanner.perform_scan', new=perform_scan):
+            results = asyncio.run(
+                scanner.perform_scans_async([(url, [], None) for url in self.urls], concurrency=2)
+            )
+
+        self.assertEqual([result.landing_page_url for result in results], self.urls)
+        self.assertNotIn(threading.current_thread(), scan_threads)
+
+
+@mock.patch('scanner.scanner.check_http2', new=lambda url, cache=None: {'http2': False})
+class ConditionalScanTest(TestCase):
+    def setUp(self):
+        self.url = 'https://securedrop.org'
+        self.prior_result = ScanResult(
+            live=True,
+            landing_page_url=self.url,
+            http_status_200_ok=True,
+            expected_encoding=True,
+            safe_onion_address=False,
+            no_analytics=False,
+            no_cross_domain_assets=False,
+            cross_domain_asset_summary='https://securedrop.org\n  * (img-src) https://example.com/a.gif\n',
+            etag='"abc"',
+            last_modified='Wed, 21 Oct 2015 07:28:00 GMT',
+        )
+
+    def not_modified_response(self, headers):
+        page = requests.models.Response()
+        page.status_code = 304
+        page.url = self.url
+        page.headers.update(headers)
+        page._content = b''
+        return page
+
+    def test_should_send_validators_of_prior_result(self):
+        self.assertEqual(
+            scanner.get_conditional_headers(self.prior_result),
+            {
+                'If-None-Match': '"abc"',
+                'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT',
+            },
+        )
+
+    def test_should_not_keep_validators_too_long_to_store(self):
+        page = self.not_modified_response({
+            'ETag': '"{}"'.format('a' * 300),
+            'Last-Modified': 'Thu, 22 Oct 2015 07:28:00 GMT',
+        })
+        page.status_code = 200
+
+        self.assertEqual(scanner.parse_validators(page, self.prior_result), {
+            'etag': '',
+            'last_modified': 'Thu, 22 Oct 2015 07:28:00 GMT',
+        })
+
+    def test_should_not_send_validators_without_prior_result(self):
+        self.assertEqual(scanner.get_conditional_headers(None), {})
+
+    @mock.patch('scanner.scanner.extract_tag_assets')
+    @mock.patch('scanner.scanner.request_page')
+    def test_should_reuse_content_checks_if_not_modified(self, request_page, extract_tag_assets):
+        request_page.return_value = self.not_modified_response({
+            'Content-Security-Policy': "default-src 'self'",
+        })
+
+        result = scanner.perform_scan(self.url, [], prior_result=self.prior_result)
+
+        request_page.assert_called_once_with(
+            self.url,
+            session=None,
+            headers={
+                'If-None-Match': '"abc"',
+                'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT',
+            },
+            max_body_size=None,
+        )
+        extract_tag_assets.assert_not_called()
+        self.assertIs(result.safe_onion_address, False)
+        self.assertIs(result.no_analytics, False)
+        self.assertIs(result.no_cross_domain_assets, False)
+        self.assertEqual(result.cross_domain_asset_summary, self.prior_result.cross_domain_asset_summary)
+        self.assertIs(result.http_status_200_ok, True)
+        self.assertIs(result.expected_encoding, True)
+        self.assertEqual(result.etag, '"abc"')
+
+    @mock.patch('scanner.scanner.request_page')
+    def test_should_check_headers_of_not_modified_response(self, request_page):
+        request_page.return_value = self.not_modified_response({
+            'Content-Security-Policy': "default-src 'self'",
+            'ETag': '"def"',
+        })
+
+        result = scanner.perform_scan(self.url, [], prior_result=self.prior_result)
+
+        self.assertIs(result.csp_origin_only, True)
+        self.assertIs(result.xss_protection, False)
+        self.assertEqual(result.etag, '"def"')
+
+    @mock.patch('scanner.scanner.request_page')
+    def test_bulk_scan_should_keep_prior_result_if_not_modified(self, request_page):
+        entry = DirectoryEntryFactory.create(
+            title='SecureDrop',
+            landing_page_url=self.url,
+            onion_address='notreal.onion'
+        )
+        request_page.return_value = self.not_modified_response({})
+        scanner.perform_scan(self.url, [], prior_result=self.prior_result).save()
+
+        scanner.bulk_scan(DirectoryEntry.objects.all(), revalidate=True)
+
+        self.assertEqual(
+            request_page.call_args[1]['headers'],
+            {'If-None-Match': '"abc"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+        )
+        self.assertEqual(entry.results.count(), 1)
+
+    @mock.patch('scanner.scanner.request_page')
+    def test_bulk_scan_should_request_page_in_full_if_entry_was_edited(self, request_page):
+        entry = DirectoryEntryFactory.create(
+            title='SecureDrop',
+            landing_page_url=self.url,
+            onion_address='notreal.onion'
+        )
+        request_page.return_value = self.not_modified_response({})
+        scanner.perform_scan(self.url, [], prior_result=self.prior_result).save()
+        entry.permitted_domains_for_assets = ['example.com']
+        entry.save_revision().publish()
+        page = html_response(b'<html><img src="https://example.com/a.gif"></html>')
+        page.url = self.url
+        page.body_truncated = False
+        request_page.return_value = page
+
+        scanner.bulk_scan(DirectoryEntry.objects.all(), revalidate=True)
+
+        self.assertEqual(request_page.call_args[1]['headers'], {})
+        result = entry.results.latest('result_last_seen')
+        self.assertIs(result.no_cross_domain_assets, True)
+        self.assertEqual(result.cross_domain_asset_summary, '')
+
+
+class PageBodyTest(TestCase):
+    def scrape(self, page, **kwargs):
+        with mock.patch('scanner.scanner.requests.get', return_value=page):
+            return scanner.request_and_scrape_page(NON_EXISTENT_URL, **kwargs)
+
+    def test_should_read_whole_body_within_limit(self):
+        page, soup = self.scrape(html_response(b'<html><p>hello</p></html>'))
+
+        self.assertEqual(page.content, b'<html><p>hello</p></html>')
+        self.assertEqual(soup.p.get_text(), 'hello')
+        self.assertIs(page.body_truncated, False)
+
+    def test_should_truncate_body_over_limit(self):
+        body = b'<html><p>hello</p>' + b' ' * 1000 + b'</html>'
+
+        page, soup = self.scrape(html_response(body), max_body_size=100)
+
+        self.assertEqual(page.content, body[:100])
+        self.assertEqual(soup.p.get_text(), 'hello')
+        self.assertIs(page.body_truncated, True)
+
+    def test_should_not_read_body_that_is_not_html(self):
+        page, soup = self.scrape(html_response(b'%PDF-1.4', content_type='application/pdf'))
+
+        self.assertEqual(page.content, b'')
+        self.assertIs(page.body_truncated, True)
+
+    @mock.patch('scanner.scanner.check_http2', return_value={'http2': False})
+    def test_should_record_truncation_on_result(self, check_http2):
+        page = html_response(b'<html>' + b' ' * 1000 + b'</html>')
+
+        with mock.patch('scanner.scanner.requests.get', return_value=page):
+            result = scanner.perform_scan(NON_EXISTENT_URL, [], max_body_size=100)
+
+        self.assertIs(result.live, True)
+        self.assertIs(result.body_truncated, True)
+
+    @mock.patch('scanner.scanner.check_http2', return_value={'http2': False})
+    def test_should_decode_page_with_charset_from_headers(self, check_http2):
+        page = html_response('<html><img src="https://example.net/café.png"></html>'.encode('utf-8'))
+
+        with mock.patch('scanner.scanner.requests.get', return_value=page):
+            result = scanner.perform_scan(NON_EXISTENT_URL, [])
+
+        self.assertIn('https://example.net/café.png', result.cross_domain_asset_summary)
+
+
+@mock.patch('scanner.scanner.check_http2', new=lambda url, cache=None: {'http2': False})
+class ScriptScanBudgetTest(TestCase):
+    def scan(self):
+        page = html_response(b"<html><script>var a = 'https://example.org/';</script></html>")
+        with mock.patch('scanner.scanner.requests.get', return_value=page):
+            return scanner.perform_scan(NON_EXISTENT_URL, [])
+
+    def test_should_record_complete_script_scan(self):
+        result = self.scan()
+
+        self.assertIs(result.script_scan_incomplete, False)
+        self.assertIn('example.org', result.ignored_cross_domain_assets)
+
+    @mock.patch('scanner.scanner.SCRIPT_SCAN_BUDGET', -1)
+    def test_should_record_when_script_scan_budget_runs_out(self):
+        result = self.scan()
+
+        self.assertIs(result.script_scan_incomplete, True)
+        # The script was not searched, so its asset went unnoticed
+        self.assertEqual(result.ignored_cross_domain_assets, '')
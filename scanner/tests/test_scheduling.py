@@ -0,0 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from directory.models import DirectoryEntry, ScanResult
+from directory.tests.factories import DirectoryEntryFactory, ScanResultFactory
+from scanner import scheduling
+from scanner.scanner import bulk_scan
+
+
+class DueEntriesTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def scanned(self, hours_ago, grade):
+        entry = DirectoryEntryFactory()
+        result = ScanResultFactory(securedrop=entry, landing_page_url=entry.landing_page_url)
+        # result_last_seen and grade are set on save, so override them after
+        ScanResult.objects.filter(pk=result.pk).update(
+            result_last_seen=self.now - timedelta(hours=hours_ago),
+            grade=grade,
+        )
+        return entry
+
+    def test_never_scanned_entries_are_due_first(self):
+        overdue = self.scanned(hours_ago=10, grade='F')
+        never_scanned = DirectoryEntryFactory()
+
+        self.assertEqual(
+            scheduling.due_entries(now=self.now),
+            [never_scanned, overdue],
+        )
+
+    def test_entries_are_due_by_grade(self):
+        self.scanned(hours_ago=30, grade='A')
+        failing = self.scanned(hours_ago=6, grade='F')
+        passing = self.scanned(hours_ago=30, grade='B')
+
+        self.assertEqual(
+            scheduling.due_entries(now=self.now),
+            [failing, passing],
+        )
+
+    def test_entries_edited_since_their_last_scan_are_due(self):
+        entry = self.scanned(hours_ago=1, grade='A')
+        entry.last_published_at = self.now
+        entry.save()
+
+        self.assertEqual(scheduling.due_entries(now=self.now), [entry])
+
+    def test_entries_scanned_in_bulk_are_due_by_grade(self):
+        passing = DirectoryEntryFactory(landing_page_url='https://securedrop.org')
+        failing = DirectoryEntryFactory(landing_page_url='https://freedom.press')
+        results = {
+            passing.landing_page_url: ScanResultFactory.build(no_failures=True),
+            failing.landing_page_url: ScanResultFactory.build(severe_warning=True),
+        }
+
+        def perform_scan(url, permitted_domains, session=None, prior_result=None, max_body_size=None):
+            result = results[url]
+            result.landing_page_url = url
+            return result
+
+        with mock.patch('scanner.scanner.perform_scan', new=perform_scan):
+            bulk_scan(DirectoryEntry.objects.all())
+
+        self.assertEqual(
+            scheduling.due_entries(now=timezone.now() + timedelta(hours=30)),
+            [failing],
+        )
+
+    def test_ungraded_results_are_graded_when_scanned_unchanged(self):
+        entry = DirectoryEntryFactory(landing_page_url='https://securedrop.org')
+        result = ScanResultFactory(landing_page_url=entry.landing_page_url, no_failures=True)
+        ScanResult.objects.filter(pk=result.pk).update(grade='?')
+        result.refresh_from_db()
+
+        with mock.patch('scanner.scanner.perform_scan', return_value=result):
+            bulk_scan(DirectoryEntry.objects.all())
+
+        result.refresh_from_db()
+        self.assertEqual(entry.results.get(), result)
+        self.assertEqual(result.grade, 'A')
+
+    def test_delisted_entries_are_not_due(self):
+        DirectoryEntryFactory(delisted='other')
+
+        self.assertEqual(scheduling.due_entries(now=self.now), [])
+
+
+class ScheduledScanTest(TestCase):
+    @mock.patch('scanner.scheduling.bulk_scan')
+    def test_should_scan_due_entries_in_batches(self, bulk_scan):
+        entries = [DirectoryEntryFactory() for _ in range(3)]
+
+        scanned = scheduling.scheduled_scan(batch_size=2, workers=1)
+
+        self.assertEqual(sorted(e.pk for e in scanned), sorted(e.pk for e in entries))
+        self.assertEqual(bulk_scan.call_count, 2)
+        self.assertEqual(bulk_scan.call_args.kwargs, {'workers': 1})
+
+    @mock.patch('scanner.scheduling.bulk_scan')
+    def test_should_not_start_batches_after_the_time_budget(self, bulk_scan):
+        for _ in range(3):
+            DirectoryEntryFactory()
+
+        with mock.patch('scanner.scheduling.time.monotonic', side_effect=[0, 0, 60]):
+            scanned = scheduling.scheduled_scan(time_budget=30, batch_size=2)
+
+        self.assertEqual(len(scanned), 2)
+        self.assertEqual(bulk_scan.call_count, 1)
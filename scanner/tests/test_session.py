@@ -0,0 +1,90 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+import requests
+
+from scanner.scanner import validate_no_cookies
+from scanner.session import ScanSession
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'<html></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FirstVisitCookieHandler(KeepAliveHandler):
+    """Sets a cookie only for visitors that do not send one yet"""
+
+    def send_header(self, keyword, value):
+        super().send_header(keyword, value)
+        if keyword == 'Content-Type' and 'Cookie' not in self.headers:
+            super().send_header('Set-Cookie', 'visitor=1; Path=/')
+
+
+class ScanSessionTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_should_reuse_connections_to_the_same_host(self):
+        with ScanSession() as session:
+            for path in ('', 'script.js', 'style.css'):
+                session.get(self.url + path, timeout=5)
+
+            self.assertEqual(session.stats(), {
+                'requests': 3,
+                'connections': 1,
+                'reused_connections': 2,
+            })
+
+    def test_should_count_connections_of_evicted_pools(self):
+        with ScanSession(pool_hosts=1) as session:
+            session.get(self.url, timeout=5)
+            session.get(self.url.replace('127.0.0.1', 'localhost'), timeout=5)
+
+            self.assertEqual(session.stats()['connections'], 2)
+
+
+class ScanSessionCookieTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FirstVisitCookieHandler)
+        self.urls = [
+            'http://127.0.0.1:{}/{}'.format(self.server.server_port, path)
+            for path in ('', 'other/')
+        ]
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_should_not_keep_cookies_between_pages(self):
+        without_session = [
+            validate_no_cookies(requests.get(url, timeout=5)) for url in self.urls
+        ]
+        with ScanSession() as session:
+            with_session = [
+                validate_no_cookies(session.get(url, timeout=5)) for url in self.urls
+            ]
+            self.assertEqual(len(session.cookies), 0)
+
+        self.assertEqual(without_session, [False, False])
+        self.assertEqual(with_session, without_session)
@@ -0,0 +1,93 @@
+from unittest import TestCase, mock
+
+from scanner.trackers import (
+    TrackerMatcher,
+    find_script_trackers,
+    find_trackers,
+    get_script_tracker_matcher,
+    get_tracker_matcher,
+    register_tracker,
+)
+
+
+class TrackerMatcherTestCase(TestCase):
+    def setUp(self):
+        self.matcher = TrackerMatcher({
+            'Chartbeat': ('chartbeat.js', 'chartbeat_mab.js'),
+            'Google Analytics': ('ga.js', 'analytics.js'),
+            'Quantcast': ('quant.js',),
+        })
+
+    def test_should_report_every_tracker_found(self):
+        html = b'<script src="/ga.js"></script><script src="//x/chartbeat_mab.js"></script>'
+        self.assertEqual(self.matcher.match(html), {'Google Analytics', 'Chartbeat'})
+
+    def test_should_match_text(self):
+        self.assertEqual(self.matcher.match('load("quant.js")'), {'Quantcast'})
+
+    def test_should_match_nothing_without_signatures(self):
+        self.assertEqual(self.matcher.match(b'<p>Nothing to see here</p>'), set())
+        self.assertEqual(TrackerMatcher({}).match('ga.js'), set())
+
+
+class AnchoredTrackerMatcherTestCase(TestCase):
+    def setUp(self):
+        self.matcher = TrackerMatcher(
+            {'Google Analytics': ('google-analytics.com/analytics.js',)},
+            anchored=True,
+        )
+
+    def test_should_match_at_start_of_host(self):
+        for text in (
+            "load('https://www.google-analytics.com/analytics.js')",
+            "'//google-analytics.com/analytics.js'",
+            "'https://ssl' + '.google-analytics.com/analytics.js'",
+        ):
+            with self.subTest(text=text):
+                self.assertEqual(self.matcher.match(text), {'Google Analytics'})
+
+    def test_should_not_match_within_host(self):
+        self.assertEqual(self.matcher.match('https://notgoogle-analytics.com/analytics.js'), set())
+        self.assertEqual(self.matcher.match(b'https://my-google-analytics.com/analytics.js'), set())
+
+
+class ScriptTrackerTestCase(TestCase):
+    def test_should_not_report_bare_script_names(self):
+        bundle = (
+            "// Replaces analytics.js and ga.js with our own beacon.js\n"
+            "var names = ['analytics.js', 'chartbeat.js', 'quant.js'];"
+        )
+
+        self.assertEqual(find_script_trackers(bundle), set())
+        self.assertNotEqual(find_trackers(bundle), set())
+
+    def test_should_report_scripts_loaded_from_tracker_hosts(self):
+        script = (
+            "s.src = 'https://www.googletagmanager.com/gtag/js?id=G-1';"
+            "t.src = '//static.chartbeat.com/js/chartbeat_mab.js';"
+        )
+
+        self.assertEqual(find_script_trackers(script), {'Google Analytics', 'Chartbeat'})
+
+
+class TrackerRegistryTestCase(TestCase):
+    def test_should_find_registered_trackers(self):
+        with mock.patch.dict('scanner.trackers.TRACKER_SIGNATURES', clear=True):
+            get_tracker_matcher.cache_clear()
+            register_tracker('Example', ['example-analytics.js'])
+
+            self.assertEqual(find_trackers(b'<script src="example-analytics.js">'), {'Example'})
+        get_tracker_matcher.cache_clear()
+
+    def test_should_find_registered_script_trackers(self):
+        with mock.patch.dict('scanner.trackers.TRACKER_SIGNATURES', clear=True), \
+                mock.patch.dict('scanner.trackers.SCRIPT_TRACKER_SIGNATURES', clear=True):
+            register_tracker('Example', ['example-analytics.js'], ['cdn.example.net/analytics.js'])
+
+            self.assertEqual(find_script_trackers('//cdn.example.net/analytics.js'), {'Example'})
+            self.assertEqual(find_script_trackers('example-analytics.js'), set())
+        get_tracker_matcher.cache_clear()
+        get_script_tracker_matcher.cache_clear()
+
+    def test_should_find_default_trackers(self):
+        self.assertEqual(find_trackers(b'https://cdn.krxd.net/controltag'), {'Krux Digital'})
@@ -1,6 +1,16 @@
-from unittest import TestCase
+import os
+import tempfile
+from unittest import TestCase, mock
 
-from scanner.utils import url_to_domain, extract_strings, extract_urls
+from scanner.benchmarks import fixture_scripts, fuzz_strings, url_extraction_mismatches
+from scanner.utils import (
+    DOMAIN_EXTRACTOR,
+    DomainCache,
+    suffix_list_extractor,
+    url_to_domain,
+    extract_strings,
+    extract_urls,
+)
 
 
 class URLToDomainTestCase(TestCase):
@@ -17,6 +27,57 @@ class URLToDomainTestCase(TestCase):
         self.assertEqual(url_to_domain(url), 'securedrop.org')
 
 
+class DomainCacheTestCase(TestCase):
+    def test_should_split_host_names(self):
+        extracted = DomainCache().extract('https://user@www.example.co.uk:8080/path?query')
+
+        self.assertEqual(
+            (extracted.subdomain, extracted.domain, extracted.suffix),
+            ('www', 'example', 'co.uk'),
+        )
+        self.assertEqual(extracted.registered_domain, 'example.co.uk')
+
+    def test_should_split_each_host_name_once(self):
+        cache = DomainCache()
+
+        with mock.patch('scanner.utils.DOMAIN_EXTRACTOR', wraps=DOMAIN_EXTRACTOR) as extractor:
+            cache.extract('https://example.com/a.js')
+            cache.extract('http://example.com/b.css')
+            cache.extract('https://cdn.example.com/a.js')
+
+        self.assertEqual(extractor.call_count, 2)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'size': 2})
+
+    def test_should_evict_least_recently_used_host_names(self):
+        cache = DomainCache(maxsize=2)
+        cache.extract('a.example.com')
+        cache.extract('b.example.com')
+        cache.extract('a.example.com')
+        cache.extract('c.example.com')
+
+        cache.extract('a.example.com')
+        cache.extract('b.example.com')
+
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 4, 'size': 2})
+
+
+class SuffixListExtractorTestCase(TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.dat', delete=False) as f:
+            f.write('// ===BEGIN ICANN DOMAINS===\ncom\nexample\n')
+        self.path = f.name
+        self.addCleanup(os.remove, self.path)
+
+    @mock.patch('requests.adapters.HTTPAdapter.send')
+    def test_should_only_use_the_given_suffix_list(self, send):
+        extract = suffix_list_extractor(self.path)
+
+        self.assertEqual(extract('https://www.securedrop.example/').registered_domain, 'securedrop.example')
+        # co.uk is not in the list
+        self.assertEqual(extract('https://www.example.co.uk/').suffix, '')
+        send.assert_not_called()
+
+
 class StringExtractionTestCase(TestCase):
     def test_should_extract_unique_strings_from_js_block(self):
         js = """var _comscore = _comscore || [];
@@ -54,3 +115,19 @@ class UrlExtractionTestCase(TestCase):
         self.assertEqual(extract_urls('//cdn.example.com'), ['cdn.example.com'])
         self.assertEqual(extract_urls('//www.example.com/file.js?id='),
                          ['www.example.com/file.js?id='])
+
+    def test_should_not_extract_urls_without_a_domain(self):
+        self.assertEqual(extract_urls('https://localhost/path'), [])
+        self.assertEqual(extract_urls('a-b-c.d'), [])
+
+    def test_should_extract_urls_in_linear_time(self):
+        # WEB_URL_REGEX backtracks over the whole string from every word
+        # boundary in it
+        self.assertEqual(extract_urls('a-' * 100000), [])
+
+    def test_should_match_web_url_regex_on_fixture_scripts(self):
+        strings = (text for _, script in fixture_scripts() for text in extract_strings(script))
+        self.assertEqual(list(url_extraction_mismatches(strings)), [])
+
+    def test_should_match_web_url_regex_on_random_strings(self):
+        self.assertEqual(list(url_extraction_mismatches(fuzz_strings(20000))), [])
@@ -1,7 +1,11 @@
+import io
 import re
 
+import yaml
+from requests.adapters import BaseAdapter, HTTPAdapter
 from requests.api import get
 from requests.exceptions import ConnectionError
+from urllib3 import HTTPResponse
 
 
 NON_EXISTENT_URL = 'https://notarealsite.party'
@@ -20,3 +24,44 @@ def requests_get_mock(url, params={}, **kwargs):
     else:
         kwargs.setdefault('timeout', 5)
         return get(url, params, **kwargs)  # nosec request_without_timeout
+
+
+class CassetteAdapter(BaseAdapter):
+    """
+    A requests transport adapter that plays back the responses recorded in
+    a vcrpy cassette, by method and URL. Unlike vcrpy's connection stubs it
+    keeps no state between requests, so it can serve several threads at
+    once. Mount it on a session to scan with recorded responses
+    concurrently.
+    """
+    def __init__(self, path):
+        super().__init__()
+        with open(path) as f:
+            cassette = yaml.safe_load(f)
+        self.responses = {
+            (interaction['request']['method'], interaction['request']['uri']): interaction['response']
+            for interaction in cassette['interactions']
+        }
+        # Builds requests' responses from urllib3's, as when sending
+        self.http_adapter = HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        try:
+            recorded = self.responses[(request.method, request.url)]
+        except KeyError:
+            raise ConnectionError('No recorded response for {}'.format(request.url), request=request)
+        raw = HTTPResponse(
+            body=io.BytesIO(recorded['body']['string']),
+            headers=[
+                (name, value)
+                for name, values in recorded['headers'].items()
+                for value in values
+            ],
+            status=recorded['status']['code'],
+            reason=recorded['status']['message'],
+            preload_content=False,
+        )
+        return self.http_adapter.build_response(request, raw)
+
+    def close(self):
+        pass
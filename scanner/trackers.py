@@ -0,0 +1,121 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Set, Tuple, Union
+
+
+# Substrings identifying the scripts of third-party analytics services,
+# keyed by the name of the service.  References:
+#
+#   Google Analytics: https://support.google.com/analytics/answer/1032399?hl=en
+#   Quantcast: https://quantcast.zendesk.com/hc/en-us/articles/115014888548--Implement-Quantcast-Tag-Directly-on-Your-Site
+#   Chartbeat: http://support.chartbeat.com/docs/
+#   comScore: http://www.scorecardresearch.com/ (no public docs)
+#   Krux Digital: https://whotracks.me/trackers/krux_digital.html#News%20and%20Portals
+#   Meta Pixel: https://developers.facebook.com/docs/meta-pixel/get-started
+#   Hotjar: https://help.hotjar.com/hc/en-us/articles/115009336727
+#   Segment: https://segment.com/docs/connections/sources/catalog/libraries/website/javascript/
+#   Parse.ly: https://docs.parse.ly/parsely-tag-installation/
+TRACKER_SIGNATURES: Dict[str, Tuple[str, ...]] = {
+    'Google Analytics': ('ga.js', 'analytics.js', 'googletagmanager.com/gtag/js'),
+    'Quantcast': ('quant.js',),
+    'Chartbeat': ('chartbeat.js', 'chartbeat_mab.js'),
+    'comScore': ('beacon.js', 'scorecardresearch.com'),
+    'Krux Digital': ('krxd.net',),
+    'Meta Pixel': ('connect.facebook.net/en_US/fbevents.js',),
+    'Hotjar': ('static.hotjar.com',),
+    'Segment': ('cdn.segment.com',),
+    'Parse.ly': ('cdn.parsely.com',),
+}
+
+# Signatures of the same services that include the host their scripts are
+# loaded from.  Only these are looked for in the bodies of external
+# scripts, where a bare file name such as 'analytics.js' may just be
+# mentioned in a comment or string, and only at the start of a host name.
+SCRIPT_TRACKER_SIGNATURES: Dict[str, Tuple[str, ...]] = {
+    'Google Analytics': (
+        'google-analytics.com/ga.js',
+        'google-analytics.com/analytics.js',
+        'googletagmanager.com/gtag/js',
+    ),
+    'Quantcast': ('quantserve.com/quant.js',),
+    'Chartbeat': ('chartbeat.com/js/chartbeat.js', 'chartbeat.com/js/chartbeat_mab.js'),
+    'comScore': ('scorecardresearch.com/beacon.js',),
+    'Krux Digital': ('krxd.net/',),
+    'Meta Pixel': ('connect.facebook.net/en_US/fbevents.js',),
+    'Hotjar': ('static.hotjar.com/',),
+    'Segment': ('cdn.segment.com/',),
+    'Parse.ly': ('cdn.parsely.com/',),
+}
+
+
+def register_tracker(
+        name: str,
+        signatures: Iterable[str],
+        script_signatures: Iterable[str] = (),
+) -> None:
+    """Add an analytics service to TRACKER_SIGNATURES, or more signatures
+    to one that is already there.  Any `script_signatures` are added to
+    SCRIPT_TRACKER_SIGNATURES likewise."""
+    TRACKER_SIGNATURES[name] = TRACKER_SIGNATURES.get(name, ()) + tuple(signatures)
+    script_signatures = tuple(script_signatures)
+    if script_signatures:
+        SCRIPT_TRACKER_SIGNATURES[name] = SCRIPT_TRACKER_SIGNATURES.get(name, ()) + script_signatures
+    get_tracker_matcher.cache_clear()
+    get_script_tracker_matcher.cache_clear()
+
+
+class TrackerMatcher:
+    """Finds the signatures of several analytics services in one pass over
+    a text, using a single regular expression that combines all of them.
+    If `anchored` is set, signatures only match where they are not
+    preceded by a letter, digit or hyphen, as at the start of a host name.
+
+    """
+
+    def __init__(self, signatures: Dict[str, Tuple[str, ...]], anchored: bool = False) -> None:
+        self.trackers = {
+            signature: name
+            for name, tracker_signatures in signatures.items()
+            for signature in tracker_signatures
+        }
+        # Longest first, so that a signature is not shadowed by one that
+        # is a prefix of it
+        alternatives = sorted(self.trackers, key=len, reverse=True)
+        pattern = '|'.join(re.escape(signature) for signature in alternatives) or '(?!)'
+        if anchored:
+            pattern = r'(?<![\w-])(?:{})'.format(pattern)
+        self.pattern = re.compile(pattern)
+        self.bytes_pattern = re.compile(pattern.encode('utf-8'))
+
+    def match(self, text: Union[str, bytes]) -> Set[str]:
+        """Return the names of the analytics services found in `text`"""
+        if isinstance(text, bytes):
+            return {
+                self.trackers[match.group().decode('utf-8')]
+                for match in self.bytes_pattern.finditer(text)
+            }
+        return {self.trackers[match.group()] for match in self.pattern.finditer(text)}
+
+
+@lru_cache(maxsize=None)
+def get_tracker_matcher() -> TrackerMatcher:
+    """The matcher for TRACKER_SIGNATURES, compiled on first use"""
+    return TrackerMatcher(TRACKER_SIGNATURES)
+
+
+@lru_cache(maxsize=None)
+def get_script_tracker_matcher() -> TrackerMatcher:
+    """The matcher for SCRIPT_TRACKER_SIGNATURES, compiled on first use"""
+    return TrackerMatcher(SCRIPT_TRACKER_SIGNATURES, anchored=True)
+
+
+def find_trackers(text: Union[str, bytes]) -> Set[str]:
+    """Return the names of the analytics services whose signatures appear
+    anywhere in `text`"""
+    return get_tracker_matcher().match(text)
+
+
+def find_script_trackers(text: Union[str, bytes]) -> Set[str]:
+    """Return the names of the analytics services that the body of an
+    external script loads, by their SCRIPT_TRACKER_SIGNATURES"""
+    return get_script_tracker_matcher().match(text)
@@ -1,6 +1,14 @@
+import os
+import pathlib
 import re
+import threading
+from collections import OrderedDict
 
-from typing import Set, List
+from typing import Dict, List, Optional, Set
+
+import tldextract
+from tldextract.remote import lenient_netloc
+from tldextract.tldextract import ExtractResult
 
 WEB_URL_REGEX = re.compile(r"""\b((?:https?:\/\/)?(?:[\da-z\.-]+)\.(?:[a-z\.]{2,6})(?:[\/\w\.-?]*)*\/?)""")
 
@@ -14,6 +22,91 @@ HEADERS = {
 }
 
 
+# Number of host names whose parts are remembered by a DomainCache
+DOMAIN_CACHE_SIZE = 10000
+
+# Copy of the Public Suffix List that ships with the scanner, and where
+# `manage.py updatesuffixlist` fetches a newer one from
+PUBLIC_SUFFIX_LIST_PATH = os.path.join(os.path.dirname(__file__), 'public_suffix_list.dat')
+PUBLIC_SUFFIX_LIST_URL = 'https://publicsuffix.org/list/public_suffix_list.dat'
+
+
+def suffix_list_extractor(path: str = PUBLIC_SUFFIX_LIST_PATH) -> tldextract.TLDExtract:
+    """Return an extractor that reads its suffix list from the file at
+    `path`, and nowhere else: it neither fetches the list, nor keeps a
+    copy of it on disk, nor falls back to the copy bundled with
+    tldextract.  The file is read on the first extraction.
+
+    """
+    return tldextract.TLDExtract(
+        suffix_list_urls=(pathlib.Path(path).resolve().as_uri(),),
+        cache_dir=None,
+        fallback_to_snapshot=False,
+    )
+
+
+# Splits host names into subdomain, domain and public suffix
+DOMAIN_EXTRACTOR = suffix_list_extractor()
+
+
+class DomainCache:
+    """Least-recently-used cache of the parts of host names, as split by
+    DOMAIN_EXTRACTOR, keyed by host name.  The same hosts come up again
+    and again across the assets of a landing page and across landing
+    pages, and splitting a host name is much slower than looking it up.
+    Safe to share between threads.
+
+    """
+
+    def __init__(self, maxsize: int = DOMAIN_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._domains = OrderedDict()
+        self._lock = threading.Lock()
+
+    def warm(self) -> None:
+        """Load the suffix list now rather than on the first lookup"""
+        DOMAIN_EXTRACTOR('example.com')
+
+    def extract(self, url: str) -> ExtractResult:
+        """Split the host name of `url`, which may also be a bare host
+        name, like `tldextract.extract`"""
+        host = lenient_netloc(url)
+        with self._lock:
+            try:
+                extracted = self._domains[host]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._domains.move_to_end(host)
+                self.hits += 1
+                return extracted
+        extracted = DOMAIN_EXTRACTOR(host)
+        with self._lock:
+            self._domains[host] = extracted
+            while len(self._domains) > self.maxsize:
+                self._domains.popitem(last=False)
+        return extracted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._domains),
+        }
+
+
+# Shared by everything in the scanner that splits host names
+domain_cache = DomainCache()
+
+
+def extract_domain(url: str) -> ExtractResult:
+    """Split the host name of `url` into subdomain, domain and public
+    suffix, using the shared `domain_cache`"""
+    return domain_cache.extract(url)
+
+
 def url_to_domain(url: str) -> str:
     # Split off the protocol
     if len(url.split('//')) > 1:
@@ -28,5 +121,106 @@ def extract_strings(text: str) -> Set[str]:
     return set(re.findall(r'["\'](.*?)["\']', text))
 
 
+# Patterns for the parts of WEB_URL_REGEX, none of which backtrack: a dot
+# followed by two top-level domain characters, the top-level domain, a run
+# of host name characters, a run of either word or non-word characters
+# among them, and the path that ends a URL
+TLD_DOT_REGEX = re.compile(r'\.[a-z\.]{2}')
+TLD_REGEX = re.compile(r'[a-z\.]{2,6}')
+HOST_RUN_REGEX = re.compile(r'[\da-z\.-]*')
+HOST_WORD_REGEX = re.compile(r'[\da-z]*')
+HOST_NON_WORD_REGEX = re.compile(r'[\.-]*')
+URL_PATH_REGEX = re.compile(r'[\/\w\.-?]*')
+
+# Characters of the top-level domain part of WEB_URL_REGEX
+TLD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz.')
+
+
 def extract_urls(text: str) -> List[str]:
-    return WEB_URL_REGEX.findall(text)
+    """Find the URLs in a string.  Gives the same results as finding all
+    matches of WEB_URL_REGEX, but in time linear in the length of the
+    string, where the regex backtracks over every word boundary inside a
+    run of host name characters.
+
+    """
+    urls = []
+    reversed_text = None
+    # Where the search for the next host name continues, and the end of
+    # the last URL found, before which a scheme can't start
+    position = last_url_end = 0
+    while True:
+        # Any URL has a dot followed by two top-level domain characters
+        dot = TLD_DOT_REGEX.search(text, position)
+        if dot is None:
+            return urls
+
+        # Find the run of host name characters around that dot, not
+        # looking back past where the search continued from
+        if reversed_text is None:
+            reversed_text = text[::-1]
+        reversed_dot = len(text) - dot.start()
+        reversed_position = len(text) - position
+        run_start = dot.start() - (
+            HOST_RUN_REGEX.match(reversed_text, reversed_dot, reversed_position).end() - reversed_dot
+        )
+        run_end = HOST_RUN_REGEX.match(text, dot.start()).end()
+
+        # WEB_URL_REGEX ends the domain of a URL at the last such dot of
+        # the run, which must not be its first character
+        tld_dot = _find_tld_dot(text, run_start, run_end)
+        if tld_dot is None:
+            position = run_end
+            continue
+
+        url_start = _find_scheme(text, run_start, last_url_end)
+        if url_start is None:
+            # Otherwise the URL starts at the first word boundary in the
+            # run, and must have at least one character before the dot
+            url_start = _find_word_boundary(text, run_start, run_end)
+            if url_start >= tld_dot:
+                position = run_end
+                continue
+
+        tld_end = TLD_REGEX.match(text, tld_dot + 1).end()
+        position = last_url_end = URL_PATH_REGEX.match(text, tld_end).end()
+        urls.append(text[url_start:position])
+
+
+def _is_word_char(text: str, position: int) -> bool:
+    # As for \w in a regex, with anything out of range not being one
+    if 0 <= position < len(text):
+        char = text[position]
+        return char.isalnum() or char == '_'
+    return False
+
+
+def _find_tld_dot(text: str, start: int, end: int) -> Optional[int]:
+    dot = end
+    while True:
+        dot = text.rfind('.', start + 1, dot)
+        if dot < 0:
+            return None
+        tld = text[dot + 1:dot + 3]
+        if len(tld) == 2 and tld[0] in TLD_CHARS and tld[1] in TLD_CHARS:
+            return dot
+
+
+def _find_scheme(text: str, host_start: int, earliest: int) -> Optional[int]:
+    """The start of an 'http://' or 'https://' right before a host name,
+    if it starts on a word boundary at or after `earliest`"""
+    for scheme in ('https://', 'http://'):
+        scheme_start = host_start - len(scheme)
+        if (scheme_start >= earliest and text.startswith(scheme, scheme_start) and
+                not _is_word_char(text, scheme_start - 1)):
+            return scheme_start
+    return None
+
+
+def _find_word_boundary(text: str, start: int, end: int) -> int:
+    """The first word boundary in a run of host name characters, or the
+    end of the run if there is none"""
+    if _is_word_char(text, start) != _is_word_char(text, start - 1):
+        return start
+    if _is_word_char(text, start):
+        return min(HOST_WORD_REGEX.match(text, start).end(), end)
+    return min(HOST_NON_WORD_REGEX.match(text, start).end(), end)
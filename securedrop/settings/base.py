@@ -116,6 +116,11 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 # Make the deployment's onion service name available to templates
 ONION_HOSTNAME = os.environ.get('DJANGO_ONION_HOSTNAME')
 
+# Where static snapshots of the directory API are written whenever a
+# directory entry is published or the directory is scanned, to be served
+# without touching the database.  Snapshots are not written when unset.
+DIRECTORY_SNAPSHOT_ROOT = os.environ.get('DJANGO_DIRECTORY_SNAPSHOT_ROOT')
+
 
 ROOT_URLCONF = 'securedrop.urls'
 